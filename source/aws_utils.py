@@ -0,0 +1,565 @@
+import boto3
+import functools
+import random
+import threading
+import time
+from botocore.config import Config
+from botocore.credentials import CredentialProvider, CredentialResolver, DeferredRefreshableCredentials
+from botocore.session import get_session
+
+# Error codes returned by AWS when a request is throttled
+THROTTLE_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "EC2ThrottledException",
+    "SlowDown",
+}
+
+# Token bucket of each API family: initial rate (requests/sec), burst size, maximum rate (requests/sec)
+API_FAMILY_LIMITS = {
+    "drs": (10.0, 20, 50.0),
+    "ec2_describe": (20.0, 100, 100.0),
+    "ec2_mutate": (5.0, 50, 20.0),
+}
+
+# Lowest rate an API family is slowed down to (requests/sec)
+MIN_RATE = 0.5
+# Rate added to an API family for every DECREASE_INTERVAL of successful requests (requests/sec)
+RATE_INCREASE = 1.0
+# Throttles within this many seconds of a decrease, or of requests sent before it,
+# come from the same burst and do not decrease again
+DECREASE_INTERVAL = 1.0
+
+# Throttled requests are retried up to this many times, with jittered exponential backoff
+MAX_THROTTLE_RETRIES = 8
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 20.0
+
+# Retries of the other transient errors are left to botocore
+BOTOCORE_MAX_ATTEMPTS = 3
+
+# Session name of the roles assumed in other accounts, shown in their CloudTrail logs
+ROLE_SESSION_NAME = "BatchUpdateDrsTemplates"
+
+
+class TokenBucket:
+    """Token bucket whose rate grows additively on success and is halved when throttled"""
+
+    def __init__(self, rate, capacity, max_rate):
+        """
+        :param rate: Initial rate (requests/sec)
+        :type rate: float
+        :param capacity: Maximum number of tokens, the size of a burst
+        :type capacity: int
+        :param max_rate: Maximum rate (requests/sec)
+        :type max_rate: float
+        """
+
+        self.rate = rate
+        self.capacity = capacity
+        self.max_rate = max_rate
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.increased = self.updated
+        self.decreased = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a token is available and takes it"""
+
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            now = time.monotonic()
+            # Grows with the time spent without throttles, whatever the rate, capped so idle periods do not count
+            elapsed = min(now - max(self.increased, self.decreased), DECREASE_INTERVAL)
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE * max(elapsed, 0.0) / DECREASE_INTERVAL)
+            self.increased = now
+
+    def on_throttle(self, sent):
+        """Halves the rate, unless the previous decrease has not taken effect yet
+
+        :param sent: Time the throttled request was sent (time.monotonic)
+        :type sent: float
+        """
+
+        with self.lock:
+            self.refill()
+            # Drop the burst allowance so the slower rate applies right away
+            self.tokens = min(self.tokens, 0.0)
+            if sent >= self.decreased and self.updated - self.decreased >= DECREASE_INTERVAL:
+                self.rate = max(MIN_RATE, self.rate / 2)
+                self.decreased = self.updated
+
+
+class ConcurrencyLimit:
+    """Limit of requests in flight that grows additively on success and is halved when throttled"""
+
+    def __init__(self, max_limit=1):
+        """
+        :param max_limit: Maximum number of requests in flight
+        :type max_limit: int
+        """
+
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+
+    def set_max_limit(self, max_limit):
+        with self.condition:
+            # A limit lowered by throttling is kept, it grows back to the new maximum on success
+            if self.limit >= self.max_limit:
+                self.limit = float(max(self.max_limit, max_limit))
+            self.max_limit = max(self.max_limit, max_limit)
+            self.condition.notify_all()
+
+    def acquire(self):
+        """Blocks until the number of requests in flight is below the limit"""
+
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=None, sent=0.0):
+        """Frees a slot and adjusts the limit to the outcome of the request
+
+        :param throttled: True if throttled, False if successful, None for other errors which leave the limit as it is
+        :type throttled: bool
+        :param sent: Time the request was sent (time.monotonic)
+        :type sent: float
+        """
+
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                # Requests sent before the previous decrease do not decrease again
+                if sent >= self.decreased and now - self.decreased >= DECREASE_INTERVAL:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.decreased = now
+            elif throttled is not None:
+                # Grows by about one request per round of requests at the current limit
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class AccountLimits:
+    """Token buckets and concurrency limit of a single AWS account, as API quotas apply per account"""
+
+    def __init__(self):
+        self.buckets = {
+            family: TokenBucket(*limits) for family, limits in API_FAMILY_LIMITS.items()
+        }
+        self.concurrency = ConcurrencyLimit()
+
+
+class RateController:
+    """Client-side rate control shared by every AWS client of the process
+
+    Every request attempt takes a token from the bucket of its API family
+    (DRS, EC2 describe, EC2 mutate) and a slot from the concurrency limit
+    of its account. Throttled requests halve the rate of their family and
+    the concurrency limit, and are retried with jittered exponential
+    backoff. Successful requests grow them back additively.
+    """
+
+    def __init__(self):
+        self.accounts = {}
+        self.accounts_lock = threading.Lock()
+        self.local = threading.local()
+        self.stats_lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+
+    def get_limits(self, account):
+        """Returns the limits of an account, creating them on first use
+
+        :param account: AWS account, None for the default credentials
+        :type account: string
+        :return: Limits of the account
+        :rtype: AccountLimits
+        """
+
+        with self.accounts_lock:
+            if account not in self.accounts:
+                self.accounts[account] = AccountLimits()
+            return self.accounts[account]
+
+    def get_family(self, service_id, operation_name):
+        """Returns the API family of an operation
+
+        :param service_id: Hyphenized service ID (drs, ec2)
+        :type service_id: string
+        :param operation_name: Operation name (e.g. DescribeInstances)
+        :type operation_name: string
+        :return: API family
+        :rtype: string
+        """
+
+        if service_id != "ec2":
+            return "drs"
+        if operation_name.startswith(("Describe", "Get")):
+            return "ec2_describe"
+        return "ec2_mutate"
+
+    def before_send(self, event_name, account=None, **kwargs):
+        # event_name is before-send.<service>.<operation>
+        service_id, operation_name = event_name.split(".")[1:3]
+        limits = self.get_limits(account)
+        limits.buckets[self.get_family(service_id, operation_name)].acquire()
+        limits.concurrency.acquire()
+        self.local.concurrency = limits.concurrency
+        self.local.sent = time.monotonic()
+
+    def needs_retry(self, event_name, response, attempts, account=None, **kwargs):
+        service_id, operation_name = event_name.split(".")[1:3]
+        bucket = self.get_limits(account).buckets[self.get_family(service_id, operation_name)]
+
+        # True if throttled, False if successful, None for connection errors, 5xx and other errors
+        throttled = None
+        if response is not None:
+            error_code = response[1].get("Error", {}).get("Code")
+            if error_code in THROTTLE_ERROR_CODES:
+                throttled = True
+            elif error_code is None and response[0].status_code < 300:
+                throttled = False
+
+        sent = getattr(self.local, "sent", 0.0)
+        self.release_concurrency(throttled, sent)
+
+        with self.stats_lock:
+            self.requests += 1
+            if throttled:
+                self.throttled += 1
+
+        if not throttled:
+            if throttled is not None:
+                bucket.on_success()
+            # Any other error goes through the retry handler of botocore
+            return None
+
+        bucket.on_throttle(sent)
+        if attempts > MAX_THROTTLE_RETRIES:
+            return None
+        with self.stats_lock:
+            self.retried += 1
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempts))
+
+    def release_concurrency(self, throttled=None, sent=0.0):
+        """Frees the concurrency slot held by the request of the current thread, if any
+
+        :param throttled: True if throttled, False if successful, None for other errors which leave the limit as it is
+        :type throttled: bool
+        :param sent: Time the request was sent (time.monotonic)
+        :type sent: float
+        """
+
+        concurrency = getattr(self.local, "concurrency", None)
+        if concurrency is not None:
+            self.local.concurrency = None
+            concurrency.release(throttled, sent)
+
+    def after_call_error(self, **kwargs):
+        # Errors other than HTTPClientError skip needs-retry, the slot is freed here instead
+        self.release_concurrency()
+
+    def register(self, client, workers=1, account=None):
+        """Routes every request of a boto client through the controller
+
+        :param client: Boto client
+        :type client: boto_client
+        :param workers: Number of worker threads sharing the client
+        :type workers: int
+        :param account: AWS account of the client, None for the default credentials
+        :type account: string
+        """
+
+        self.get_limits(account).concurrency.set_max_limit(workers)
+        service_id = client.meta.service_model.service_id.hyphenize()
+        client.meta.events.register(
+            f"before-send.{service_id}", functools.partial(self.before_send, account=account)
+        )
+        # Registered first so that throttled responses get the backoff of the controller
+        client.meta.events.register_first(
+            f"needs-retry.{service_id}", functools.partial(self.needs_retry, account=account)
+        )
+        client.meta.events.register(f"after-call-error.{service_id}", self.after_call_error)
+
+    def get_summary(self):
+        """Returns a summary of the throttling observed so far
+
+        :return: Summary line
+        :rtype: string
+        """
+
+        with self.stats_lock:
+            requests, throttled, retried = self.requests, self.throttled, self.retried
+        with self.accounts_lock:
+            accounts = list(self.accounts.values()) or [AccountLimits()]
+        # With several accounts, the most throttled account is shown for each family
+        rates = ", ".join(
+            f"{family} {min(limits.buckets[family].rate for limits in accounts):.1f}/s"
+            for family in API_FAMILY_LIMITS
+        )
+        limit = sum(int(limits.concurrency.limit) for limits in accounts)
+        max_limit = sum(limits.concurrency.max_limit for limits in accounts)
+        return (
+            f"Rate control: {requests} requests, {throttled} throttled, {retried} retried, "
+            f"concurrency limit {limit} of {max_limit}, rates: {rates}"
+        )
+
+
+rate_controller = RateController()
+
+
+def get_client_config(workers=1):
+    """Returns the botocore config of clients shared by worker threads
+
+    :param workers: Number of worker threads sharing the clients
+    :type workers: int
+    :return: Client config
+    :rtype: botocore config
+    """
+
+    return Config(
+        # Size the connection pool so that worker threads do not queue on it
+        max_pool_connections=max(10, workers),
+        retries={"mode": "standard", "max_attempts": BOTOCORE_MAX_ATTEMPTS},
+    )
+
+
+def register_rate_controller(client, workers=1, account=None):
+    """Routes the requests of a boto client through the shared rate controller
+
+    :param client: Boto client
+    :type client: boto_client
+    :param workers: Number of worker threads sharing the client
+    :type workers: int
+    :param account: AWS account of the client, None for the default credentials
+    :type account: string
+    :return: The client
+    :rtype: boto_client
+    """
+
+    rate_controller.register(client, workers, account)
+    return client
+
+
+# Clients created so far, by (account, region, service)
+client_cache = {}
+client_cache_lock = threading.Lock()
+
+
+def get_client(service, region, workers=1, account=None, session=None):
+    """Returns a boto client, reusing the one created earlier for the same account, region and service
+
+    Boto clients are thread safe, so worker threads and the stages of a
+    script share one client and its open connections. A client is created
+    again only when more workers need it than its connection pool was sized for.
+
+    :param service: AWS service (drs, ec2)
+    :type service: string
+    :param region: AWS Region
+    :type region: string
+    :param workers: Number of worker threads sharing the client
+    :type workers: int
+    :param account: AWS account of the session, None for the default credentials
+    :type account: string
+    :param session: Boto session to create the client from, None for the default session
+    :type session: boto_session
+    :return: Boto client
+    :rtype: boto_client
+    """
+
+    key = (account, region, service)
+    # Creating clients from a shared session is not thread safe
+    with client_cache_lock:
+        cached = client_cache.get(key)
+        if cached is None or cached["workers"] < workers:
+            creator = session.client if session is not None else boto3.client
+            client = creator(service, region_name=region, config=get_client_config(workers))
+            # Throttled requests are slowed down and retried instead of failing
+            register_rate_controller(client, workers, account)
+            cached = {"client": client, "workers": max(workers, cached["workers"] if cached else 1)}
+            client_cache[key] = cached
+        return cached["client"]
+
+
+# STS client of the default credentials, used to assume the roles of every account
+sts_client = None
+# Sessions of the roles assumed so far, by account
+role_session_cache = {}
+# Guards role_session_locks, each account has its own lock so roles are assumed in parallel
+role_session_lock = threading.Lock()
+role_session_locks = {}
+
+
+def get_sts_client():
+    """Returns the STS client used to assume roles, shared by all accounts
+
+    :return: Boto STS client
+    :rtype: boto_client
+    """
+
+    global sts_client
+    # Creating clients from the default session is not thread safe
+    with client_cache_lock:
+        if sts_client is None:
+            sts_client = boto3.client("sts", config=get_client_config())
+        return sts_client
+
+
+class RoleCredentialProvider(CredentialProvider):
+    """Provides credentials of an assumed role, assuming it again before they expire"""
+
+    METHOD = "sts-assume-role"
+    CANONICAL_NAME = "batch-update-assume-role"
+
+    def __init__(self, assume_role):
+        """
+        :param assume_role: Assumes the role and returns the credentials metadata
+        :type assume_role: function
+        """
+
+        super().__init__()
+        self.assume_role = assume_role
+
+    def load(self):
+        return DeferredRefreshableCredentials(
+            refresh_using=self.assume_role, method=self.METHOD
+        )
+
+
+def get_role_session(account, role_name):
+    """Returns a boto session with the credentials of a role assumed in another account
+
+    The credentials are refreshed by assuming the role again before they
+    expire, so long executions keep working.
+
+    :param account: AWS account ID
+    :type account: string
+    :param role_name: Name of the IAM role to assume in the account
+    :type role_name: string
+    :return: Boto session
+    :rtype: boto_session
+    """
+
+    with role_session_lock:
+        account_lock = role_session_locks.setdefault(account, threading.Lock())
+
+    with account_lock:
+        if account in role_session_cache:
+            return role_session_cache[account]
+
+        role_arn = f"arn:aws:iam::{account}:role/{role_name}"
+        def assume_role():
+            credentials = get_sts_client().assume_role(
+                RoleArn=role_arn, RoleSessionName=ROLE_SESSION_NAME
+            )["Credentials"]
+            return {
+                "access_key": credentials["AccessKeyId"],
+                "secret_key": credentials["SecretAccessKey"],
+                "token": credentials["SessionToken"],
+                "expiry_time": credentials["Expiration"].isoformat(),
+            }
+
+        botocore_session = get_session()
+        botocore_session.register_component(
+            "credential_provider", CredentialResolver([RoleCredentialProvider(assume_role)])
+        )
+        session = boto3.Session(botocore_session=botocore_session)
+        # Assume the role now, so a role that cannot be assumed fails here rather than on the first request
+        session.get_credentials().get_frozen_credentials()
+        role_session_cache[account] = session
+        return session
+
+
+def get_sg_rules(sg_id, sg_details):
+    """Flattens the rules of a security group, one item per rule and CIDR/prefix list
+
+    :param sg_id: Security group ID
+    :type sg_id: string
+    :param sg_details: Security group as returned by describe_security_groups
+    :type sg_details: dict
+    :return: Security group rules
+    :rtype: list
+    """
+
+    sg_name = next(
+        (tag["Value"] for tag in sg_details.get("Tags", []) if tag["Key"] == "Name"),
+        "",
+    )
+    sg_rules = []
+
+    for direction, permissions in [
+        ("Inbound", sg_details["IpPermissions"]),
+        ("Outbound", sg_details["IpPermissionsEgress"]),
+    ]:
+        for rule in permissions:
+            from_port = rule.get("FromPort", "All")
+            to_port = rule.get("ToPort", "All")
+            protocol = rule.get("IpProtocol", "All")
+
+            targets = (
+                [(ip_range, "CidrIp") for ip_range in rule.get("IpRanges", [])]
+                + [(ip_range, "CidrIpv6") for ip_range in rule.get("Ipv6Ranges", [])]
+                + [
+                    (prefix_list, "PrefixListId")
+                    for prefix_list in rule.get("PrefixListIds", [])
+                ]
+            )
+            for target, cidr_key in targets:
+                sg_rules.append(
+                    {
+                        "SecurityGroupName": sg_name,
+                        "SecurityGroupID": sg_id,
+                        "Direction": direction,
+                        "Protocol": protocol,
+                        "FromPort": from_port,
+                        "ToPort": to_port,
+                        "CIDR": target[cidr_key],
+                        "RuleDescription": target.get("Description", " "),
+                    }
+                )
+
+    return sg_rules
+
+
+def get_normalized_sg_rules(sg_mappings, security_groups):
+    """Returns the rules of every mapped security group, flattened once per group
+
+    :param sg_mappings: Instance to security group mapping
+    :type sg_mappings: list
+    :param security_groups: Security groups keyed by security group ID
+    :type security_groups: dict
+    :return: Security group rules
+    :rtype: list
+    """
+
+    sg_rules = []
+    # Follow the order in which the groups first appear in the mapping
+    for sg_id in dict.fromkeys(mapping["SecurityGroupID"] for mapping in sg_mappings):
+        sg_rules.extend(get_sg_rules(sg_id, security_groups[sg_id]))
+    return sg_rules
@@ -0,0 +1,160 @@
+import json
+import os
+import signal
+import threading
+from log_utils import logActions
+
+# Set on the first Ctrl-C, workers stop picking up new servers once it is set
+stop_requested = threading.Event()
+
+
+def handle_interrupts():
+    """Makes Ctrl-C finish the servers in progress instead of aborting, a second Ctrl-C aborts"""
+
+    def interrupt(signum, frame):
+        if stop_requested.is_set():
+            raise KeyboardInterrupt
+        stop_requested.set()
+        logActions("INF", "Interrupted, finishing the servers in progress. Press Ctrl-C again to abort", None)
+
+    signal.signal(signal.SIGINT, interrupt)
+
+
+def get_journal_path(file_path, name):
+    """Returns the path of a checkpoint journal, next to the XLS doc
+
+    :param file_path: Path to the XLS doc or state file
+    :type file_path: string
+    :param name: Name of the journal (e.g. drs-eu-west-1)
+    :type name: string
+    :return: Path to the journal
+    :rtype: string
+    """
+
+    return f"{file_path}.{name}.journal"
+
+
+class Journal:
+    """Append-only JSON lines journal of the servers parsed so far
+
+    The first line holds the options of the execution, every other line the
+    result of one server. Each line is flushed to disk as soon as it is
+    written, so a crashed or interrupted execution can resume from it.
+    """
+
+    def __init__(self, path, options, resume=False):
+        """
+        :param path: Path to the journal
+        :type path: string
+        :param options: Options the results depend on, a resumed journal must have the same
+        :type options: dict
+        :param resume: Load the results of an existing journal instead of starting a new one
+        :type resume: bool
+        :raises ValueError: If an existing journal holds results and resume is not set
+        """
+
+        self.path = path
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path) and self.load(options):
+            self.file = open(path, "a")
+        else:
+            # Starting a new journal would silently discard the results of an interrupted execution
+            if not resume and self.has_results():
+                raise ValueError(
+                    f"Journal {path} holds the results of an interrupted execution. "
+                    "Execute again with '--resume' to continue it, or delete the journal to start over"
+                )
+            self.file = open(path, "w")
+            self.write({"Options": options})
+
+    def has_results(self):
+        """Checks if an existing journal holds at least one result after its header
+
+        :return: True if the journal holds results
+        :rtype: bool
+        """
+
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as journal_file:
+            journal_file.readline()
+            return journal_file.readline() != ""
+
+    def load(self, options):
+        """Reads the results of an existing journal
+
+        :param options: Options of the execution
+        :type options: dict
+        :return: False if the header is incomplete and the journal holds no results
+        :rtype: bool
+        """
+
+        valid_size = 0
+        with open(self.path) as journal_file:
+            line = journal_file.readline()
+            try:
+                header = json.loads(line) if line.endswith("\n") else None
+            except ValueError:
+                header = None
+            if not isinstance(header, dict):
+                # The execution crashed while writing the header, before any result
+                logActions("INF", f"Journal {self.path} has an incomplete header, starting a new one", None)
+                return False
+            if header.get("Options") != options:
+                raise ValueError(
+                    f"Journal {self.path} was written with different options ({header.get('Options')})"
+                )
+            valid_size = journal_file.tell()
+            for line in iter(journal_file.readline, ""):
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("Incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line is incomplete when the execution crashed while writing it
+                    break
+                self.entries[entry["Key"]] = entry
+                valid_size = journal_file.tell()
+
+        # Appending after an incomplete line would corrupt the next entry
+        with open(self.path, "r+") as journal_file:
+            journal_file.truncate(valid_size)
+        return True
+
+    def write(self, item):
+        with self.lock:
+            self.file.write(json.dumps(item, default=str) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def append(self, key, result, security_groups=None):
+        """Records the result of a server
+
+        :param key: Server key (e.g. source server ID)
+        :type key: string
+        :param result: Result of the server
+        :type result: any
+        :param security_groups: Security groups the result refers to, keyed by ID
+        :type security_groups: dict
+        """
+
+        entry = {"Key": key, "Result": result}
+        if security_groups:
+            entry["SecurityGroups"] = security_groups
+        self.write(entry)
+
+    def close(self):
+        self.file.close()
+
+
+def remove_journal(path):
+    """Deletes a journal, once its results are stored in the XLS doc
+
+    :param path: Path to the journal
+    :type path: string
+    """
+
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,93 +1,403 @@
 import pandas as pd
 import argparse
-import datetime
-from openpyxl import load_workbook
+from log_utils import logActions
+from workbook_utils import load_sheets, write_sheets
+
+# Operator-editable columns of Mod_TemplateConfigs, carried over between executions
+MOD_TEMPLATE_NEW_COLUMNS = [
+    "New_LaunchState",
+    "New_DrsSubnetID",
+    "New_CopyPrivateIP",
+    "New_PrivateIPs",
+    "New_RightSizing",
+    "New_InstanceType",
+    "New_SecurityGroupIDs",
+]
+
+# Column order of Mod_VolumeConfigs
+MOD_VOLUME_COLUMNS = [
+    "Hostname",
+    "SourceServerID",
+    "OriginInstanceID",
+    "EC2_DeviceName",
+    "DRS_DeviceName",
+    "EC2_Size",
+    "DRS_Size",
+    "EC2_Type",
+    "DRS_Type",
+    "New_Type",
+    "EC2_IOPS",
+    "DRS_IOPS",
+    "New_IOPS",
+    "EC2_Throughput",
+    "DRS_Throughput",
+    "New_Throughput",
+]
+
+# Operator-editable columns of Mod_VolumeConfigs, carried over between executions
+MOD_VOLUME_NEW_COLUMNS = ["New_Type", "New_IOPS", "New_Throughput"]
+
+# Column order of Mod_TemplateConfigs
+MOD_TEMPLATE_COLUMNS = [
+    "Hostname",
+    "SourceServerID",
+    "OriginInstanceID",
+    "DRS_LaunchState",
+    "New_LaunchState",
+    "EC2_SubnetName",
+    "DRS_SubnetName",
+    "New_DrsSubnetID",
+    "CopyPrivateIP",
+    "New_CopyPrivateIP",
+    "EC2_PrivateIPs",
+    "DRS_PrivateIPs",
+    "New_PrivateIPs",
+    "DRS_RightSizing",
+    "New_RightSizing",
+    "EC2_InstanceType",
+    "DRS_InstanceType",
+    "New_InstanceType",
+    "EC2_SecurityGroups",
+    "DRS_SecurityGroups",
+    "DRS_SecurityGroupIDs",
+    "New_SecurityGroupIDs",
+]
 
 
-def logActions(level, short_desc, long_desc):
-    """Formats and prints logs
-
-    :param level: Log level (INF,ERR)
-    :type level: string
-    :param short_desc: Short log message
-    :type short_desc: string
-    :param long_desc: Long log message
-    :type long_desc: string
-    """
-    
-    dt_object = datetime.datetime.now()
-    dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
-    prefix = f"{dt_string} - {level}:"
-    print(f"{prefix} {short_desc}")
-    if long_desc:
-        print(f"{prefix} {long_desc}")
-
+def get_excel_data(file_path):
+    """Returns data from existing worksheets related to EC2, DRS and the modifications
 
-def get_existing_mod_worksheets(file_path):
-    """Returns data from existing modification worksheets
+    EC2 and modification worksheets that do not exist yet are returned empty.
 
     :param file_path: path to the XLS doc
     :type file_path: string
-    :return: Existing data
-    :rtype: list
+    :return: list_df, drs_df, ec2_df, drs_vols_df, ec2_vols_df, old_mod_df, old_vol_df
+    :rtype: pd dataframe, pd dataframe, pd dataframe, pd dataframe, pd dataframe, pd dataframe, pd dataframe
     """
-    
     try:
-        wb = load_workbook(file_path, read_only=False)
-        if "Mod_TemplateConfigs" in wb.sheetnames:
-            old_mod_df = pd.read_excel(file_path, sheet_name="Mod_TemplateConfigs")
-        else:
-            old_mod_df = pd.DataFrame()
-        if "Mod_VolumeConfigs" in wb.sheetnames:
-            old_vol_df = pd.read_excel(file_path, sheet_name="Mod_VolumeConfigs")
-        else:
-            old_vol_df = pd.DataFrame()
+        volume_columns = ["DeviceName", "Size", "Type", "IOPS", "Throughput"]
+        sheets = load_sheets(
+            file_path,
+            {
+                "List": ["Hostname", "SourceServerID", "OriginInstanceID", "Region"],
+                "DRS_Details": [
+                    "OriginInstanceID",
+                    "LaunchState",
+                    "SubnetName",
+                    "CopyPrivateIP",
+                    "PrivateIPs",
+                    "Rightsizing",
+                    "InstanceType",
+                    "SecurityGroupNames",
+                    "SecurityGroupIDs",
+                ],
+                "EC2_Details": [
+                    "InstanceID",
+                    "Subnet_Name",
+                    "PrivateIPs",
+                    "InstanceType",
+                    "SecurityGroupNames",
+                ],
+                "DRS_Vol_Details": ["OriginInstanceID", *volume_columns],
+                "EC2_Vol_Details": ["InstanceID", *volume_columns],
+                "Mod_TemplateConfigs": ["OriginInstanceID", *MOD_TEMPLATE_NEW_COLUMNS],
+                "Mod_VolumeConfigs": [
+                    "OriginInstanceID",
+                    "DRS_DeviceName",
+                    "DRS_Size",
+                    *MOD_VOLUME_NEW_COLUMNS,
+                ],
+            },
+            optional_sheets=[
+                "EC2_Details",
+                "EC2_Vol_Details",
+                "Mod_TemplateConfigs",
+                "Mod_VolumeConfigs",
+            ],
+        )
 
         logActions(
-            "INF",
-            f"Successfully parsed existing Mod worksheets from XLS document ({file_path})",
-            None,
+            "INF", f"Successfully parsed data from XLS document ({file_path})", None
+        )
+        return (
+            sheets["List"],
+            sheets["DRS_Details"],
+            sheets["EC2_Details"],
+            sheets["DRS_Vol_Details"],
+            sheets["EC2_Vol_Details"],
+            sheets["Mod_TemplateConfigs"],
+            sheets["Mod_VolumeConfigs"],
         )
-        return old_mod_df, old_vol_df
 
     except Exception as e:
+        logActions("ERR", f"Failed to parse data from XLS document ({file_path})", e)
+        exit(1)
+
+
+def get_region_columns(list_df):
+    """Returns the Region column of the server list, as a list of columns to add to the modification data
+
+    :param list_df: List of servers
+    :type list_df: pd dataframe
+    :return: ["Region"] for XLS docs listing several Regions, an empty list otherwise
+    :rtype: list
+    """
+
+    return ["Region"] if "Region" in list_df.columns else []
+
+
+def drop_duplicate_keys(df, key, sheet_name):
+    """Reports duplicate keys of a worksheet and keeps the first row of each key
+
+    :param df: Worksheet data
+    :type df: pd dataframe
+    :param key: Key column, or list of key columns
+    :type key: string
+    :param sheet_name: Worksheet name, used for reporting
+    :type sheet_name: string
+    :return: Worksheet data with unique keys
+    :rtype: pd dataframe
+    """
+
+    keys = [key] if isinstance(key, str) else key
+    duplicated = df.duplicated(subset=keys, keep="first")
+    for values in df.loc[duplicated, keys].drop_duplicates().itertuples(index=False):
         logActions(
             "ERR",
-            f"Failed to parse existing Mod worksheets from XLS document ({file_path})",
-            e,
+            f"Duplicate {'/'.join(keys)} {'/'.join(map(str, values))} on {sheet_name}, only its first row is used",
+            None,
         )
+    return df[~duplicated]
+
+
+def select_columns(df, key, columns, sheet_name):
+    """Returns the key and the given columns of a worksheet, renamed and with unique keys
+
+    :param df: Worksheet data, may be empty if the worksheet does not exist
+    :type df: pd dataframe
+    :param key: Key column of the worksheet
+    :type key: string
+    :param columns: Worksheet columns mapped to their names in the comparison data
+    :type columns: dict
+    :param sheet_name: Worksheet name, used for reporting
+    :type sheet_name: string
+    :return: Key column (as OriginInstanceID) and the renamed columns
+    :rtype: pd dataframe
+    """
 
+    if df.empty:
+        return pd.DataFrame(columns=["OriginInstanceID", *columns.values()])
 
-def get_excel_data(file_path):
-    """Returns data from existing worksheets realted to EC2 and DRS
+    df = drop_duplicate_keys(df, key, sheet_name)
+    return df[[key, *columns]].rename(
+        columns={key: "OriginInstanceID", **columns}
+    )
 
-    :param file_path: path to the XLS doc
-    :type file_path: string
-    :return: list_df, drs_df, ec2_df, drs_vols_df, ec2_vols_df
-    :rtype: list, list, list, list, list
+
+def create_template_comparison(list_df, drs_df, ec2_df, old_mod_df):
+    """Generates the general modification data by joining all sources on OriginInstanceID
+
+    :param list_df: List of servers
+    :type list_df: pd dataframe
+    :param drs_df: DRS data
+    :type drs_df: pd dataframe
+    :param ec2_df: EC2 data
+    :type ec2_df: pd dataframe
+    :param old_mod_df: Existing general modification data
+    :type old_mod_df: pd dataframe
+    :return: General modification data
+    :rtype: pd dataframe
     """
-    try:
-        list_df = pd.read_excel(file_path, sheet_name="List")
-        drs_df = pd.read_excel(file_path, sheet_name="DRS_Details")
-        drs_vols_df = pd.read_excel(file_path, sheet_name="DRS_Vol_Details")
-
-        wb = load_workbook(file_path, read_only=True)
-        if "EC2_Details" in wb.sheetnames:
-            ec2_df = pd.read_excel(file_path, sheet_name="EC2_Details")
-        else:
-            ec2_df = pd.DataFrame()
-        if "EC2_Vol_Details" in wb.sheetnames:
-            ec2_vols_df = pd.read_excel(file_path, sheet_name="EC2_Vol_Details")
-        else:
-            ec2_vols_df = pd.DataFrame()
 
+    drs_part = select_columns(
+        drs_df,
+        "OriginInstanceID",
+        {
+            "LaunchState": "DRS_LaunchState",
+            "SubnetName": "DRS_SubnetName",
+            "CopyPrivateIP": "CopyPrivateIP",
+            "PrivateIPs": "DRS_PrivateIPs",
+            "Rightsizing": "DRS_RightSizing",
+            "InstanceType": "DRS_InstanceType",
+            "SecurityGroupNames": "DRS_SecurityGroups",
+            "SecurityGroupIDs": "DRS_SecurityGroupIDs",
+        },
+        "DRS_Details",
+    )
+    ec2_part = select_columns(
+        ec2_df,
+        "InstanceID",
+        {
+            "Subnet_Name": "EC2_SubnetName",
+            "PrivateIPs": "EC2_PrivateIPs",
+            "InstanceType": "EC2_InstanceType",
+            "SecurityGroupNames": "EC2_SecurityGroups",
+        },
+        "EC2_Details",
+    )
+    # Carry over the values the operator already entered
+    old_mod_part = select_columns(
+        old_mod_df,
+        "OriginInstanceID",
+        {column: column for column in MOD_TEMPLATE_NEW_COLUMNS},
+        "Mod_TemplateConfigs",
+    )
+
+    missing = ~list_df["OriginInstanceID"].isin(drs_part["OriginInstanceID"])
+    for _, row in list_df[missing].iterrows():
         logActions(
-            "INF", f"Successfully parsed data from XLS document ({file_path})", None
+            "ERR",
+            f"No DRS data found for {row['SourceServerID']} ({row['Hostname']})",
+            None,
         )
-        return list_df, drs_df, ec2_df, drs_vols_df, ec2_vols_df
 
-    except Exception as e:
-        logActions("ERR", f"Failed to parse data from XLS document ({file_path})", e)
+    region_columns = get_region_columns(list_df)
+    gnrl_df = (
+        list_df[["Hostname", "SourceServerID", "OriginInstanceID", *region_columns]]
+        .merge(drs_part, on="OriginInstanceID", how="left")
+        .merge(ec2_part, on="OriginInstanceID", how="left")
+        .merge(old_mod_part, on="OriginInstanceID", how="left")
+    )
+
+    logActions(
+        "INF",
+        f"Successfully created comparison data for {len(gnrl_df)} servers",
+        None,
+    )
+    # The Region comes last, as on the DRS sheets
+    return gnrl_df[[*MOD_TEMPLATE_COLUMNS, *region_columns]]
+
+
+def match_volumes(drs_vols, other_vols, sheet_name):
+    """Pairs each DRS volume with a volume of the same server from another worksheet
+
+    Volumes are paired by device name first. The remaining volumes of each
+    server are then paired by their rank when ordered by size.
+
+    :param drs_vols: DRS volumes with OriginInstanceID, DRS_DeviceName and DRS_Size columns
+    :type drs_vols: pd dataframe
+    :param other_vols: Volumes with OriginInstanceID, DeviceName and Size columns
+    :type other_vols: pd dataframe
+    :param sheet_name: Worksheet the other volumes come from, used for reporting
+    :type sheet_name: string
+    :return: The other volumes aligned on the index of drs_vols, NaN where there is no match
+    :rtype: pd dataframe
+    """
+
+    other_vols = drop_duplicate_keys(
+        other_vols, ["OriginInstanceID", "DeviceName"], sheet_name
+    )
+    drs_keys = drs_vols[["OriginInstanceID", "DRS_DeviceName", "DRS_Size"]].rename(
+        columns={"DRS_DeviceName": "DeviceName", "DRS_Size": "Size"}
+    )
+
+    by_device = (
+        drs_keys.drop(columns="Size")
+        .reset_index()
+        .merge(other_vols, on=["OriginInstanceID", "DeviceName"], how="inner")
+    )
+
+    # Rank the volumes left unpaired on each side by size, per server
+    paired = other_vols.set_index(["OriginInstanceID", "DeviceName"]).index.isin(
+        by_device.set_index(["OriginInstanceID", "DeviceName"]).index
+    )
+    rest_drs = drs_keys.drop(index=by_device["index"]).sort_values(
+        by=["OriginInstanceID", "Size"], kind="stable"
+    )
+    rest_other = other_vols[~paired].sort_values(
+        by=["OriginInstanceID", "Size"], kind="stable"
+    )
+    rest_drs["SizeRank"] = rest_drs.groupby("OriginInstanceID").cumcount()
+    rest_other = rest_other.assign(
+        SizeRank=rest_other.groupby("OriginInstanceID").cumcount()
+    )
+    by_size = (
+        rest_drs[["OriginInstanceID", "SizeRank"]]
+        .reset_index()
+        .merge(rest_other, on=["OriginInstanceID", "SizeRank"], how="inner")
+        .drop(columns="SizeRank")
+    )
+
+    matched = pd.concat([by_device, by_size]).set_index("index")
+    return matched.drop(columns="OriginInstanceID").reindex(drs_vols.index)
+
+
+def create_volume_comparison(list_df, drs_vols_df, ec2_vols_df, old_vol_df):
+    """Generates the volume modification data, pairing DRS, EC2 and existing volume rows
+
+    :param list_df: List of servers
+    :type list_df: pd dataframe
+    :param drs_vols_df: DRS volume data
+    :type drs_vols_df: pd dataframe
+    :param ec2_vols_df: EC2 volume data
+    :type ec2_vols_df: pd dataframe
+    :param old_vol_df: Existing volume modification data
+    :type old_vol_df: pd dataframe
+    :return: Volume modification data
+    :rtype: pd dataframe
+    """
+
+    region_columns = get_region_columns(list_df)
+    if drs_vols_df.empty:
+        return pd.DataFrame(columns=[*MOD_VOLUME_COLUMNS, *region_columns])
+
+    # One row per DRS volume, ordered as the List sheet and by size within each server
+    servers = list_df[["Hostname", "SourceServerID", "OriginInstanceID", *region_columns]].assign(
+        ListPosition=range(len(list_df))
+    )
+    vol_df = (
+        servers.merge(
+            drs_vols_df[
+                ["OriginInstanceID", "DeviceName", "Size", "Type", "IOPS", "Throughput"]
+            ].rename(
+                columns={
+                    "DeviceName": "DRS_DeviceName",
+                    "Size": "DRS_Size",
+                    "Type": "DRS_Type",
+                    "IOPS": "DRS_IOPS",
+                    "Throughput": "DRS_Throughput",
+                }
+            ),
+            on="OriginInstanceID",
+            how="inner",
+        )
+        .sort_values(by=["ListPosition", "DRS_Size"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+    if ec2_vols_df.empty:
+        ec2_matched = pd.DataFrame(index=vol_df.index)
+    else:
+        ec2_matched = match_volumes(
+            vol_df,
+            ec2_vols_df[
+                ["InstanceID", "DeviceName", "Size", "Type", "IOPS", "Throughput"]
+            ].rename(columns={"InstanceID": "OriginInstanceID"}),
+            "EC2_Vol_Details",
+        ).rename(columns=lambda column: f"EC2_{column}")
+
+    # Carry over the values the operator already entered
+    if old_vol_df.empty:
+        old_matched = pd.DataFrame(index=vol_df.index)
+    else:
+        old_matched = match_volumes(
+            vol_df,
+            old_vol_df[
+                ["OriginInstanceID", "DRS_DeviceName", "DRS_Size", *MOD_VOLUME_NEW_COLUMNS]
+            ].rename(columns={"DRS_DeviceName": "DeviceName", "DRS_Size": "Size"}),
+            "Mod_VolumeConfigs",
+        ).drop(columns=["Size"])
+
+    vol_df = pd.concat([vol_df, ec2_matched, old_matched], axis=1).reindex(
+        columns=[*MOD_VOLUME_COLUMNS, *region_columns]
+    )
+
+    logActions(
+        "INF",
+        f"Successfully created volume comparison data for {len(vol_df)} volumes",
+        None,
+    )
+    return vol_df
 
 
 def create_comparison_data(
@@ -96,200 +406,25 @@ def create_comparison_data(
     """Generates and returns the data to put into modification worksheets
 
     :param list_df: List of servers
-    :type list_df: list
+    :type list_df: pd dataframe
     :param drs_df: DRS data
-    :type drs_df: list
+    :type drs_df: pd dataframe
     :param ec2_df: EC2 data
-    :type ec2_df: list
+    :type ec2_df: pd dataframe
     :param drs_vols_df: DRS volume data
-    :type drs_vols_df: list
+    :type drs_vols_df: pd dataframe
     :param ec2_vols_df: EC2 volume data
-    :type ec2_vols_df: list
+    :type ec2_vols_df: pd dataframe
     :param old_mod_df: Existing general modification data
-    :type old_mod_df: list
+    :type old_mod_df: pd dataframe
     :param old_vol_df: Existing volume modification data
-    :type old_vol_df: list
+    :type old_vol_df: pd dataframe
     :return: gnrl_data, vol_data
-    :rtype: list, list
+    :rtype: pd dataframe, pd dataframe
     """
-    
-    gnrl_data = []
-    vol_data = []
-
-    for index, list_row in list_df.iterrows():
-        try:
-            ss_id = list_row["SourceServerID"]
-            hostname = list_row["Hostname"]
-            instance_id = list_row["OriginInstanceID"]
-
-            if old_mod_df.empty:
-                new_launch_state = ""
-                new_subnet_id = ""
-                new_copy_pip = ""
-                new_ips = ""
-                new_rightsizing = ""
-                new_instance_type = ""
-                new_sg_ids = ""
-            else:
-                new_launch_state = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id, "New_LaunchState"
-                ].squeeze()
-                new_subnet_id = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id, "New_DrsSubnetID"
-                ].squeeze()
-                new_copy_pip = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id, "New_CopyPrivateIP"
-                ].squeeze()
-                new_ips = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id, "New_PrivateIPs"
-                ].squeeze()
-                new_rightsizing = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id, "New_RightSizing"
-                ].squeeze()
-                new_instance_type = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id, "New_InstanceType"
-                ].squeeze()
-                new_sg_ids = old_mod_df.loc[
-                    old_mod_df["OriginInstanceID"] == instance_id,
-                    "New_SecurityGroupIDs",
-                ].squeeze()
-
-            if ec2_df.empty:
-                ec2_subnet_name = ""
-                ec2_ips = ""
-                ec2_instance_type = ""
-                ec2_sg_names = ""
-            else:
-                ec2_subnet_name = ec2_df.loc[
-                    ec2_df["InstanceID"] == instance_id, "Subnet_Name"
-                ].squeeze()
-                ec2_ips = ec2_df.loc[
-                    ec2_df["InstanceID"] == instance_id, "PrivateIPs"
-                ].squeeze()
-                ec2_instance_type = ec2_df.loc[
-                    ec2_df["InstanceID"] == instance_id, "InstanceType"
-                ].squeeze()
-                ec2_sg_names = ec2_df.loc[
-                    ec2_df["InstanceID"] == instance_id, "SecurityGroupNames"
-                ].squeeze()
-
-            gnrl_data.append(
-                {
-                    "Hostname": hostname,
-                    "SourceServerID": ss_id,
-                    "OriginInstanceID": instance_id,
-                    "DRS_LaunchState": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "LaunchState"
-                    ].squeeze(),
-                    "New_LaunchState": new_launch_state,
-                    "EC2_SubnetName": ec2_subnet_name,
-                    "DRS_SubnetName": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "SubnetName"
-                    ].squeeze(),
-                    "New_DrsSubnetID": new_subnet_id,
-                    "CopyPrivateIP": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "CopyPrivateIP"
-                    ].squeeze(),
-                    "New_CopyPrivateIP": new_copy_pip,
-                    "EC2_PrivateIPs": ec2_ips,
-                    "DRS_PrivateIPs": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "PrivateIPs"
-                    ].squeeze(),
-                    "New_PrivateIPs": new_ips,
-                    "DRS_RightSizing": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "Rightsizing"
-                    ].squeeze(),
-                    "New_RightSizing": new_rightsizing,
-                    "EC2_InstanceType": ec2_instance_type,
-                    "DRS_InstanceType": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "InstanceType"
-                    ].squeeze(),
-                    "New_InstanceType": new_instance_type,
-                    "EC2_SecurityGroups": ec2_sg_names,
-                    "DRS_SecurityGroups": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "SecurityGroupNames"
-                    ].squeeze(),
-                    "DRS_SecurityGroupIDs": drs_df.loc[
-                        drs_df["OriginInstanceID"] == instance_id, "SecurityGroupIDs"
-                    ].squeeze(),
-                    "New_SecurityGroupIDs": new_sg_ids,
-                }
-            )
-
-            drs_vols_filtered_df = drs_vols_df[
-                drs_vols_df["OriginInstanceID"] == instance_id
-            ].sort_values(by="Size", ascending=True)
-            if not ec2_vols_df.empty:
-                ec2_vols_filtered_df = ec2_vols_df[
-                    ec2_vols_df["InstanceID"] == instance_id
-                ].sort_values(by="Size", ascending=True)
-
-            if old_vol_df.empty:
-                old_vols_filtered_df = old_vol_df
-            else:
-                old_vols_filtered_df = old_vol_df[
-                    old_vol_df["OriginInstanceID"] == instance_id
-                ].sort_values(by="DRS_Size", ascending=True)
-
-            for index, row in drs_vols_filtered_df.iterrows():
-                drs_device_name = drs_vols_filtered_df["DeviceName"][index]
-                drs_size = drs_vols_filtered_df["Size"][index]
-                drs_type = drs_vols_filtered_df["Type"][index]
-                drs_iops = drs_vols_filtered_df["IOPS"][index]
-                drs_tp = drs_vols_filtered_df["Throughput"][index]
-                
-                if not ec2_vols_df.empty:
-                    ec2_device_name = ec2_vols_filtered_df["DeviceName"][index]
-                    ec2_size = ec2_vols_filtered_df["Size"][index]
-                    ec2_type = ec2_vols_filtered_df["Type"][index]
-                    ec2_iops = ec2_vols_filtered_df["IOPS"][index]
-                    ec2_tp = ec2_vols_filtered_df["Throughput"][index]
-                else:
-                    ec2_device_name = ""
-                    ec2_size = ""
-                    ec2_type = ""
-                    ec2_iops = ""
-                    ec2_tp = ""
-
-                if old_vols_filtered_df.empty:
-                    new_type = ""
-                    new_iops = ""
-                    new_throughput = ""
-                else:
-                    new_type = old_vols_filtered_df["New_Type"][index]
-                    new_iops = old_vols_filtered_df["New_IOPS"][index]
-                    new_throughput = old_vols_filtered_df["New_Throughput"][index]
-
-                vol_data.append(
-                    {
-                        "Hostname": hostname,
-                        "SourceServerID": ss_id,
-                        "OriginInstanceID": instance_id,
-                        "EC2_DeviceName": ec2_device_name,
-                        "DRS_DeviceName": drs_device_name,
-                        "EC2_Size": ec2_size,
-                        "DRS_Size": drs_size,
-                        "EC2_Type": ec2_type,
-                        "DRS_Type": drs_type,
-                        "New_Type": new_type,
-                        "EC2_IOPS": ec2_iops,
-                        "DRS_IOPS": drs_iops,
-                        "New_IOPS": new_iops,
-                        "EC2_Throughput": ec2_tp,
-                        "DRS_Throughput": drs_tp,
-                        "New_Throughput": new_throughput,
-                    }
-                )
-
-            logActions(
-                "INF",
-                f"Successfully created comparison data for {ss_id} ({hostname})",
-                None,
-            )
-        except Exception as e:
-            logActions(
-                "ERR", f"Failed to create comparison data for {ss_id} ({hostname})", e
-            )
+
+    gnrl_data = create_template_comparison(list_df, drs_df, ec2_df, old_mod_df)
+    vol_data = create_volume_comparison(list_df, drs_vols_df, ec2_vols_df, old_vol_df)
 
     return gnrl_data, vol_data
 
@@ -308,11 +443,10 @@ def update_workbook(gnrl_data, vol_data, file_path):
     try:
         gnrl_data_df = pd.DataFrame(gnrl_data)
         vol_data_df = pd.DataFrame(vol_data)
-        with pd.ExcelWriter(
-            file_path, engine="openpyxl", mode="a", if_sheet_exists="replace"
-        ) as writer:
-            gnrl_data_df.to_excel(writer, sheet_name="Mod_TemplateConfigs", index=False)
-            vol_data_df.to_excel(writer, sheet_name="Mod_VolumeConfigs", index=False)
+        write_sheets(
+            file_path,
+            {"Mod_TemplateConfigs": gnrl_data_df, "Mod_VolumeConfigs": vol_data_df},
+        )
 
         logActions(
             "INF",
@@ -332,7 +466,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+        "--workbook-path", type=str, required=False, help="Path to the XLSX file, or to a SQLite state file (.db)"
     )
     # Parse the arguments
     args = parser.parse_args()
@@ -342,8 +476,9 @@ if __name__ == "__main__":
     if file_path == None:
         file_path = "DRS_Templates.xlsx"
 
-    old_mod_df, old_vol_df = get_existing_mod_worksheets(file_path)
-    list_df, drs_df, ec2_df, drs_vols_df, ec2_vols_df = get_excel_data(file_path)
+    list_df, drs_df, ec2_df, drs_vols_df, ec2_vols_df, old_mod_df, old_vol_df = (
+        get_excel_data(file_path)
+    )
     gnrl_data, vol_data = create_comparison_data(
         list_df, drs_df, ec2_df, drs_vols_df, ec2_vols_df, old_mod_df, old_vol_df
     )
@@ -1,25 +1,15 @@
-import pandas as pd
-import boto3
 import argparse
-import datetime
-
-def logActions(level, short_desc, long_desc):
-    """Formats and prints logs
-
-    :param level: Log level (INF,ERR)
-    :type level: string
-    :param short_desc: Short log message
-    :type short_desc: string
-    :param long_desc: Long log message
-    :type long_desc: string
-    """
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from aws_utils import get_client, rate_controller
+from log_utils import logActions
+from workbook_utils import create_state_db, is_state_db, save_workbook, set_header_style
 
-    dt_object = datetime.datetime.now()
-    dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
-    prefix = f"{dt_string} - {level}:"
-    print(f"{prefix} {short_desc}")
-    if long_desc:
-        print(f"{prefix} {long_desc}")
+# Column order of the All_Servers and List sheets
+SERVER_LIST_COLUMNS = ["SourceServerID", "Hostname", "Region"]
 
 def init_aws_client(region):
     """Initializes DRS boto client
@@ -31,7 +21,7 @@ def init_aws_client(region):
     """
     
     try:
-        drs_client = boto3.client("drs", region_name=region)
+        drs_client = get_client("drs", region)
 
         logActions("INF", "Successfully created AWS client", None)
         return drs_client
@@ -39,58 +29,148 @@ def init_aws_client(region):
         logActions("ERR", "Failed to create AWS client", e)
         exit(1)
 
-def get_server_list(drs_client):
-    """Returns the full list of the source servers
+def get_server_list(drs_client, region):
+    """Yields the source servers one page at a time
 
     :param drs_client: Boto DRS client
     :type drs_client: boto_client
-    :return: list of dicts with all DRS source servers
-    :rtype: list
+    :param region: AWS Region of the DRS client
+    :type region: string
+    :return: generator of lists of dicts with the DRS source servers of each page
+    :rtype: generator
     """
     
     try:
-        # Fetch all source servers
-        response = drs_client.describe_source_servers()
-        
-        # Process each source server and extract the ID and Name tag value
-        source_servers = response.get('items', [])
-        ss_list = []
-
-        for server in source_servers:
-            
-            server_id = server['sourceServerID']
-            source_hostname = server["tags"]["Name"]
-
-            ss_list.append({
-                'SourceServerID': server_id,
-                'Hostname': source_hostname
-            })
-            logActions("INF", f"Fetched source server {server_id} ({source_hostname})", None)
-
-        return ss_list
+        # Fetch all source servers, following nextToken until the last page
+        paginator = drs_client.get_paginator("describe_source_servers")
+        page_number = 0
+        total_servers = 0
+        page_start = time.perf_counter()
+
+        for page in paginator.paginate():
+            page_number += 1
+
+            # Process each source server and extract the ID and Name tag value
+            source_servers = page.get('items', [])
+            ss_list = []
+
+            for server in source_servers:
+                
+                server_id = server['sourceServerID']
+                source_hostname = server["tags"]["Name"]
+
+                ss_list.append({
+                    'SourceServerID': server_id,
+                    'Hostname': source_hostname,
+                    'Region': region
+                })
+                logActions("INF", f"Fetched source server {server_id} ({source_hostname})", None)
+
+            elapsed = time.perf_counter() - page_start
+            total_servers += len(ss_list)
+            rate = len(ss_list) / elapsed if elapsed > 0 else 0
+            logActions(
+                "INF",
+                f"Fetched page {page_number} with {len(ss_list)} source servers ({rate:.1f} servers/sec, {total_servers} total)",
+                None,
+            )
+
+            yield ss_list
+            page_start = time.perf_counter()
 
     except Exception as e:
         logActions("INF", f"Failed to fetch source servers", f"{e}")
         exit(1)
 
+def get_region_servers(region):
+    """Returns all source servers of a Region, run in a separate process per Region
+
+    :param region: AWS Region
+    :type region: string
+    :return: Source servers
+    :rtype: list
+    """
+
+    drs_client = init_aws_client(region)
+    ss_list = [
+        server for page in get_server_list(drs_client, region) for server in page
+    ]
+    logActions("INF", f"{region}: {rate_controller.get_summary()}", None)
+    return ss_list
+
+def get_all_regions_servers(regions):
+    """Fetches the source servers of all Regions concurrently, one process per Region
+
+    The source servers of each Region are yielded as soon as its process
+    finishes, so they are written while the other Regions are still fetched
+    and only the Regions not written yet are held in memory.
+
+    :param regions: AWS Regions
+    :type regions: list
+    :return: generator of lists with the source servers of each Region, in the order the Regions finish
+    :rtype: generator
+    """
+
+    with ProcessPoolExecutor(max_workers=len(regions)) as executor:
+        futures = {executor.submit(get_region_servers, region) for region in regions}
+        for future in as_completed(futures):
+            # Drops the finished future so its servers are freed once written
+            futures.discard(future)
+            yield future.result()
+
+def get_header_row(worksheet):
+    """Returns the header row of a write-only sheet, styled like the headers written by pandas
+
+    :param worksheet: Write-only sheet
+    :type worksheet: openpyxl worksheet
+    :return: Header cells
+    :rtype: list
+    """
+
+    header = []
+    for column in SERVER_LIST_COLUMNS:
+        cell = WriteOnlyCell(worksheet, value=column)
+        set_header_style(cell)
+        header.append(cell)
+    return header
+
 def update_workbook(
-    server_list, file_path
+    server_pages, file_path
 ):
-    """Updates the XLS document
+    """Updates the XLS document, writing the source servers page by page
 
-    :param server_list: list of the source servers
-    :type server_list: list
-    :param file_path: path to the XLS doc
+    :param server_pages: pages of source servers, as yielded by get_server_list
+    :type server_pages: iterable
+    :param file_path: path to the XLS doc or SQLite state file
     :type file_path: string
     """
     
     try:
-        ss_list_df = pd.DataFrame(server_list)
-        with pd.ExcelWriter(
-            file_path, engine="openpyxl", mode="w"
-        ) as writer:
-            ss_list_df.to_excel(writer, sheet_name="All_Servers", index=False)
-            ss_list_df.to_excel(writer, sheet_name="List", index=False)
+        if is_state_db(file_path):
+            rows = [
+                [server[column] for column in SERVER_LIST_COLUMNS]
+                for page in server_pages
+                for server in page
+            ]
+            servers_df = pd.DataFrame(rows, columns=SERVER_LIST_COLUMNS)
+            create_state_db(file_path, {"All_Servers": servers_df, "List": servers_df})
+            logActions("INF", f"Successfully created state file ({file_path})", None)
+            return
+
+        # Write-only sheets flush rows to disk as they are appended
+        wb = Workbook(write_only=True)
+        all_servers_ws = wb.create_sheet("All_Servers")
+        list_ws = wb.create_sheet("List")
+        all_servers_ws.append(get_header_row(all_servers_ws))
+        list_ws.append(get_header_row(list_ws))
+
+        for page in server_pages:
+            for server in page:
+                row = [server[column] for column in SERVER_LIST_COLUMNS]
+                all_servers_ws.append(row)
+                list_ws.append(row)
+
+        save_workbook(wb, file_path)
 
         logActions("INF", f"Successfully updated XLS document ({file_path})", None)
     except Exception as e:
@@ -101,23 +181,31 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "--region", type=str, required=True, help="Name of the DR Region"
+        "--region", type=str, nargs="+", required=True, help="Name of the DR Region. Several Regions are fetched concurrently"
     )
     parser.add_argument(
-        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+        "--workbook-path", type=str, required=False, help="Path to the XLSX file, or to a SQLite state file (.db)"
     )
     # Parse the arguments
     args = parser.parse_args()
-    region = args.region
+    # Duplicate Regions would list their source servers twice
+    regions = list(dict.fromkeys(args.region))
     file_path = args.workbook_path
 
     # Not setting '--workbook-path' defaults to 'DRS_Templates.xlsx'
     if file_path == None:
         file_path = "DRS_Templates.xlsx"
 
-    drs_client = init_aws_client(region)
-    server_list = get_server_list(drs_client)
-    update_workbook(
-        server_list, file_path
-    )
+    if len(regions) == 1:
+        drs_client = init_aws_client(regions[0])
+        server_pages = get_server_list(drs_client, regions[0])
+        update_workbook(
+            server_pages, file_path
+        )
+        logActions("INF", rate_controller.get_summary(), None)
+    else:
+        # Each Region is written as a single page, as soon as its process finishes
+        update_workbook(
+            get_all_regions_servers(regions), file_path
+        )
     logActions("INF", f"Execution finished", None)
@@ -0,0 +1,25 @@
+import datetime
+import threading
+
+log_lock = threading.Lock()
+
+
+def logActions(level, short_desc, long_desc):
+    """Formats and prints logs
+
+    :param level: Log level (INF,ERR)
+    :type level: string
+    :param short_desc: Short log message
+    :type short_desc: string
+    :param long_desc: Long log message
+    :type long_desc: string
+    """
+
+    dt_object = datetime.datetime.now()
+    dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
+    prefix = f"{dt_string} - {level}:"
+    # Keep lines from concurrent workers from interleaving
+    with log_lock:
+        print(f"{prefix} {short_desc}")
+        if long_desc:
+            print(f"{prefix} {long_desc}")
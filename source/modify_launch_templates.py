@@ -1,42 +1,32 @@
 import pandas as pd
-import boto3
 import argparse
 import datetime
-import subprocess
-import sys
+import json
+import create_mod_sheets
+import parse_drs_info
+from concurrent.futures import ThreadPoolExecutor
+from aws_utils import get_client, get_normalized_sg_rules, rate_controller
+from log_utils import log_lock, logActions
+from workbook_utils import get_sheet_names, load_sheets, normalize_value, patch_rows, write_sheets
 
+# Maximum number of IDs passed to a single describe_launch_templates call
+TEMPLATE_ID_BATCH_SIZE = 200
 
-def logActions(level, short_desc, long_desc):
-    """Formats and prints logs
 
-    :param level: Log level (INF,ERR)
-    :type level: string
-    :param short_desc: Short log message
-    :type short_desc: string
-    :param long_desc: Long log message
-    :type long_desc: string
-    """
-    
-    dt_object = datetime.datetime.now()
-    dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
-    prefix = f"{dt_string} - {level}:"
-    print(f"{prefix} {short_desc}")
-    if long_desc:
-        print(f"{prefix} {long_desc}")
-
-
-def init_aws_clients(region):
+def init_aws_clients(region, workers=1):
     """Initializes EC2 and DRS boto clients
 
     :param region: AWS Region
     :type region: string
+    :param workers: Number of worker threads sharing the clients
+    :type workers: int
     :return: DRS client, EC2 client
     :rtype: boto_client, boto_client
     """
     
     try:
-        drs_client = boto3.client("drs", region_name=region)
-        ec2_client = boto3.client("ec2", region_name=region)
+        drs_client = get_client("drs", region, workers)
+        ec2_client = get_client("ec2", region, workers)
 
         logActions("INF", "Successfully created AWS clients", None)
         return drs_client, ec2_client
@@ -50,376 +40,1089 @@ def get_excel_data(file_path):
 
     :param file_path: Path to the XLS doc
     :type file_path: string
-    :return: drs_df, mod_df, vol_dfs
-    :rtype: list, list, list
+    :return: drs_df, drs_vol_df, mod_df, vol_dfs
+    :rtype: list, list, list, list
     """
     try:
-        drs_df = pd.read_excel(file_path, sheet_name="DRS_Details")
-        mod_df = pd.read_excel(file_path, sheet_name="Mod_TemplateConfigs")
-        vol_dfs = pd.read_excel(file_path, sheet_name="Mod_VolumeConfigs")
+        sheets = load_sheets(
+            file_path,
+            {
+                "DRS_Details": [
+                    "Region",
+                    "SourceServerName",
+                    "OriginInstanceID",
+                    "SourceServerID",
+                    "TemplateID",
+                    "TemplateVersion",
+                    "CopyPrivateIP",
+                    "LaunchState",
+                    "Rightsizing",
+                    "InstanceType",
+                    "SubnetID",
+                    "PrivateIPs",
+                    "SecurityGroupIDs",
+                ],
+                "DRS_Vol_Details": [
+                    "OriginInstanceID",
+                    "DeviceName",
+                    "Type",
+                    "IOPS",
+                    "Throughput",
+                ],
+                "Mod_TemplateConfigs": [
+                    "OriginInstanceID",
+                    "New_LaunchState",
+                    "New_DrsSubnetID",
+                    "New_CopyPrivateIP",
+                    "New_PrivateIPs",
+                    "New_RightSizing",
+                    "New_InstanceType",
+                    "New_SecurityGroupIDs",
+                ],
+                "Mod_VolumeConfigs": [
+                    "OriginInstanceID",
+                    "DRS_DeviceName",
+                    "New_Type",
+                    "New_IOPS",
+                    "New_Throughput",
+                ],
+            },
+        )
+        drs_df = sheets["DRS_Details"]
+        drs_vol_df = sheets["DRS_Vol_Details"]
+        mod_df = sheets["Mod_TemplateConfigs"]
+        vol_dfs = sheets["Mod_VolumeConfigs"]
 
         logActions("INF", f"Successfully parsed XLS document ({file_path})", None)
-        return drs_df, mod_df, vol_dfs
+        return drs_df, drs_vol_df, mod_df, vol_dfs
 
     except Exception as e:
         logActions("ERR", f"Failed to parse XLS document ({file_path})", e)
         exit(1)
 
 
-def update_launch_templates(drs_df, mod_df, vol_dfs):
-    """Makes the modification of the launch templates
+def get_raw_details(file_path, ss_ids):
+    """Reads the raw launch configuration and launch template data stored by parse_drs_info.py
+
+    :param file_path: Path to the XLS doc
+    :type file_path: string
+    :param ss_ids: IDs of the source servers to read
+    :type ss_ids: list
+    :return: Raw data keyed by source server ID, empty if the XLS doc has none
+    :rtype: dict
+    """
+
+    try:
+        raw_df = load_sheets(
+            file_path,
+            {"DRS_Raw_Details": None},
+            optional_sheets=["DRS_Raw_Details"],
+            keys={"DRS_Raw_Details": ("SourceServerID", ss_ids)},
+        )["DRS_Raw_Details"]
+        if raw_df.empty:
+            logActions(
+                "INF",
+                f"No raw DRS data found on XLS document, all launch data will be fetched ({file_path})",
+                None,
+            )
+            return {}
+        return {row["SourceServerID"]: row for row in raw_df.to_dict("records")}
+    except Exception as e:
+        logActions("ERR", f"Failed to parse raw DRS data from XLS document ({file_path})", e)
+        return {}
+
+
+def get_default_template_versions(ec2_client, template_ids):
+    """Returns the current default version of launch templates, in batches
+
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param template_ids: Launch template IDs
+    :type template_ids: list
+    :return: Default version numbers keyed by launch template ID, templates that could not be described are left out
+    :rtype: dict
+    """
+
+    template_ids = list(dict.fromkeys(template_ids))
+    default_versions = {}
+    paginator = ec2_client.get_paginator("describe_launch_templates")
+    for start in range(0, len(template_ids), TEMPLATE_ID_BATCH_SIZE):
+        batch = template_ids[start : start + TEMPLATE_ID_BATCH_SIZE]
+        try:
+            for page in paginator.paginate(LaunchTemplateIds=batch):
+                for template in page["LaunchTemplates"]:
+                    default_versions[template["LaunchTemplateId"]] = template[
+                        "DefaultVersionNumber"
+                    ]
+        except Exception as e:
+            logActions(
+                "ERR",
+                f"Failed to describe {len(batch)} launch templates, their data will be fetched per server",
+                e,
+            )
+    return default_versions
+
+
+def split_list(value):
+    """Splits a comma-separated cell value
+
+    :param value: Cell value
+    :type value: string
+    :return: Stripped, non-empty items
+    :rtype: list
+    """
+
+    if pd.isnull(value):
+        return []
+    return [item.strip() for item in str(value).split(",") if item.strip() != ""]
+
+
+def get_mod_targets(mod_row, mod_vol_rows, hostname):
+    """Returns the requested configuration of a source server, as entered in the Mod sheets
+
+    Empty cells are left out of the targets.
+
+    :param mod_row: Mod_TemplateConfigs row of the server, None if there is none
+    :type mod_row: pd series
+    :param mod_vol_rows: Mod_VolumeConfigs rows of the server
+    :type mod_vol_rows: pd dataframe
+    :param hostname: Name of the source server, for error messages
+    :type hostname: string
+    :return: Requested values keyed by option, volume options keyed by device name under 'Volumes'
+    :rtype: dict
+    """
+
+    targets = {"Volumes": {}}
+
+    if mod_row is not None:
+        new_launch_state = mod_row["New_LaunchState"]
+        if not pd.isnull(new_launch_state):
+            new_value = str(new_launch_state).upper()
+            if new_value not in ["STARTED", "STOPPED"]:
+                raise Exception(
+                    f"Invalid new launch state for {hostname}. Valid options: <STARTED|STOPPED>"
+                )
+            targets["LaunchState"] = new_value
+
+        new_copy_private_ip = mod_row["New_CopyPrivateIP"]
+        if not pd.isnull(new_copy_private_ip):
+            new_value = str(new_copy_private_ip).upper()
+            if new_value not in ["TRUE", "FALSE"]:
+                raise Exception(
+                    f"Invalid new copy private IP value for {hostname}. Valid options: <TRUE|FALSE>"
+                )
+            targets["CopyPrivateIP"] = new_value == "TRUE"
+
+        new_rightsizing = mod_row["New_RightSizing"]
+        if not pd.isnull(new_rightsizing):
+            new_value = str(new_rightsizing).upper()
+            if new_value not in ["NO", "BASIC", "IN_AWS"]:
+                raise Exception(
+                    f"Invalid new rightsizing value for {hostname}. Valid options: <NO|BASIC|IN_AWS>"
+                )
+            targets["Rightsizing"] = "NONE" if new_value == "NO" else new_value
+
+        if not pd.isnull(mod_row["New_DrsSubnetID"]):
+            targets["SubnetID"] = mod_row["New_DrsSubnetID"]
+        if not pd.isnull(mod_row["New_PrivateIPs"]):
+            targets["PrivateIPs"] = split_list(mod_row["New_PrivateIPs"])
+        if not pd.isnull(mod_row["New_SecurityGroupIDs"]):
+            targets["SecurityGroupIDs"] = sorted(split_list(mod_row["New_SecurityGroupIDs"]))
+        if not pd.isnull(mod_row["New_InstanceType"]):
+            targets["InstanceType"] = mod_row["New_InstanceType"]
+
+    for vol_index, vol_row in mod_vol_rows.iterrows():
+        vol_targets = {}
+        if not pd.isnull(vol_row["New_Type"]):
+            vol_targets["Type"] = vol_row["New_Type"]
+        if not pd.isnull(vol_row["New_IOPS"]):
+            vol_targets["IOPS"] = int(vol_row["New_IOPS"])
+        if not pd.isnull(vol_row["New_Throughput"]):
+            vol_targets["Throughput"] = int(vol_row["New_Throughput"])
+        if vol_targets:
+            targets["Volumes"][vol_row["DRS_DeviceName"]] = vol_targets
+
+    return targets
+
+
+def get_snapshot_config(drs_row, drs_vol_rows):
+    """Returns the configuration of a source server as recorded in the DRS_Details and DRS_Vol_Details sheets
+
+    :param drs_row: DRS_Details row of the server
+    :type drs_row: pd series
+    :param drs_vol_rows: DRS_Vol_Details rows of the server
+    :type drs_vol_rows: pd dataframe
+    :return: Current values keyed by option, volume options keyed by device name under 'Volumes'
+    :rtype: dict
+    """
+
+    return {
+        "LaunchState": drs_row["LaunchState"],
+        "CopyPrivateIP": drs_row["CopyPrivateIP"],
+        "Rightsizing": drs_row["Rightsizing"],
+        "SubnetID": "" if pd.isnull(drs_row["SubnetID"]) else drs_row["SubnetID"],
+        "PrivateIPs": split_list(drs_row["PrivateIPs"]),
+        "SecurityGroupIDs": split_list(drs_row["SecurityGroupIDs"]),
+        "InstanceType": drs_row["InstanceType"],
+        "Volumes": {
+            vol_row["DeviceName"]: {
+                "Type": vol_row["Type"],
+                "IOPS": vol_row["IOPS"],
+                "Throughput": vol_row["Throughput"],
+            }
+            for vol_index, vol_row in drs_vol_rows.iterrows()
+        },
+    }
+
+
+def get_live_config(lc, ltv_data):
+    """Returns the configuration of a source server from its launch configuration and launch template data
+
+    :param lc: Launch configuration, as returned by get_launch_configuration
+    :type lc: dict
+    :param ltv_data: Launch template data of the template version
+    :type ltv_data: dict
+    :return: Current values keyed by option, volume options keyed by device name under 'Volumes'
+    :rtype: dict
+    """
+
+    nic = ltv_data["NetworkInterfaces"][0]
+    return {
+        "LaunchState": lc["launchDisposition"],
+        "CopyPrivateIP": lc["copyPrivateIp"],
+        "Rightsizing": lc["targetInstanceTypeRightSizingMethod"],
+        "SubnetID": nic.get("SubnetId", ""),
+        "PrivateIPs": [
+            addr["PrivateIpAddress"] for addr in nic.get("PrivateIpAddresses", [])
+        ],
+        "SecurityGroupIDs": nic.get("Groups", []),
+        "InstanceType": ltv_data["InstanceType"],
+        "Volumes": {
+            vol["DeviceName"]: {
+                "Type": vol["Ebs"].get("VolumeType"),
+                "IOPS": vol["Ebs"].get("Iops"),
+                "Throughput": vol["Ebs"].get("Throughput"),
+            }
+            for vol in ltv_data["BlockDeviceMappings"]
+        },
+    }
+
+
+def get_changes(current, targets):
+    """Compares the current configuration of a source server with the requested one
+
+    :param current: Current configuration, as returned by get_snapshot_config or get_live_config
+    :type current: dict
+    :param targets: Requested configuration, as returned by get_mod_targets
+    :type targets: dict
+    :return: Before/after values of every option that changes, grouped per launch configuration, launch template and volume
+    :rtype: dict
+    """
+
+    lc_changes = {}
+    lt_changes = {}
+    vol_changes = {}
+
+    def add_change(changes, option, before, after):
+        changes[option] = {"Before": normalize_value(before), "After": normalize_value(after)}
+
+    for option in ["LaunchState", "Rightsizing"]:
+        if option in targets and str(current[option]).upper() != targets[option]:
+            add_change(lc_changes, option, current[option], targets[option])
+    if "CopyPrivateIP" in targets:
+        if str(current["CopyPrivateIP"]).upper() != str(targets["CopyPrivateIP"]).upper():
+            add_change(lc_changes, "CopyPrivateIP", current["CopyPrivateIP"], targets["CopyPrivateIP"])
+
+    if "SubnetID" in targets and current["SubnetID"] != targets["SubnetID"]:
+        add_change(lt_changes, "SubnetID", current["SubnetID"], targets["SubnetID"])
+    if "PrivateIPs" in targets and current["PrivateIPs"] != targets["PrivateIPs"]:
+        lt_changes["PrivateIPs"] = {
+            "Before": list(current["PrivateIPs"]),
+            "After": list(targets["PrivateIPs"]),
+        }
+    if "SecurityGroupIDs" in targets:
+        old_sgs = sorted(current["SecurityGroupIDs"])
+        if old_sgs != targets["SecurityGroupIDs"]:
+            lt_changes["SecurityGroupIDs"] = {
+                "Before": old_sgs,
+                "After": list(targets["SecurityGroupIDs"]),
+            }
+    # A custom instance type only applies when rightsizing is disabled
+    rightsizing = targets.get("Rightsizing", current["Rightsizing"])
+    if "InstanceType" in targets and str(rightsizing).upper() == "NONE":
+        if current["InstanceType"] != targets["InstanceType"]:
+            add_change(lt_changes, "InstanceType", current["InstanceType"], targets["InstanceType"])
+
+    for dev_name, vol_targets in targets["Volumes"].items():
+        if dev_name not in current["Volumes"]:
+            continue
+        current_vol = current["Volumes"][dev_name]
+        dev_changes = {}
+        if "Type" in vol_targets:
+            if str(current_vol["Type"]).upper() != str(vol_targets["Type"]).upper():
+                add_change(dev_changes, "Type", current_vol["Type"], vol_targets["Type"])
+        for option in ["IOPS", "Throughput"]:
+            if option in vol_targets and current_vol[option] != vol_targets[option]:
+                add_change(dev_changes, option, current_vol[option], vol_targets[option])
+        if dev_changes:
+            vol_changes[dev_name] = dev_changes
+
+    changes = {}
+    if lc_changes:
+        changes["LaunchConfiguration"] = lc_changes
+    if lt_changes:
+        changes["LaunchTemplate"] = lt_changes
+    if vol_changes:
+        changes["Volumes"] = vol_changes
+    return changes
+
+
+def get_targets_from_changes(changes):
+    """Returns the requested configuration of a source server from the changes recorded in a plan
+
+    :param changes: Changes, as returned by get_changes
+    :type changes: dict
+    :return: Requested configuration, in the format returned by get_mod_targets
+    :rtype: dict
+    """
+
+    targets = {"Volumes": {}}
+    for group in ["LaunchConfiguration", "LaunchTemplate"]:
+        for option, change in changes.get(group, {}).items():
+            targets[option] = change["After"]
+    for dev_name, dev_changes in changes.get("Volumes", {}).items():
+        targets["Volumes"][dev_name] = {
+            option: change["After"] for option, change in dev_changes.items()
+        }
+    return targets
+
+
+def apply_changes(lc, ltv_data, changes):
+    """Applies changes to a launch configuration and launch template data
+
+    :param lc: Launch configuration, as returned by get_launch_configuration
+    :type lc: dict
+    :param ltv_data: Launch template data of the template version
+    :type ltv_data: dict
+    :param changes: Changes, as returned by get_changes
+    :type changes: dict
+    """
+
+    lc_keys = {
+        "LaunchState": "launchDisposition",
+        "CopyPrivateIP": "copyPrivateIp",
+        "Rightsizing": "targetInstanceTypeRightSizingMethod",
+    }
+    for option, change in changes.get("LaunchConfiguration", {}).items():
+        lc[lc_keys[option]] = change["After"]
+
+    nic = ltv_data["NetworkInterfaces"][0]
+    lt_changes = changes.get("LaunchTemplate", {})
+    if "SubnetID" in lt_changes:
+        nic["SubnetId"] = lt_changes["SubnetID"]["After"]
+    if "PrivateIPs" in lt_changes:
+        nic["PrivateIpAddresses"] = [
+            {"Primary": ip_index == 0, "PrivateIpAddress": ip}
+            for ip_index, ip in enumerate(lt_changes["PrivateIPs"]["After"])
+        ]
+    if "SecurityGroupIDs" in lt_changes:
+        nic["Groups"] = list(lt_changes["SecurityGroupIDs"]["After"])
+    if "InstanceType" in lt_changes:
+        ltv_data["InstanceType"] = lt_changes["InstanceType"]["After"]
+
+    vol_keys = {"Type": "VolumeType", "IOPS": "Iops", "Throughput": "Throughput"}
+    vol_changes = changes.get("Volumes", {})
+    for ltv_vol in ltv_data["BlockDeviceMappings"]:
+        for option, change in vol_changes.get(ltv_vol["DeviceName"], {}).items():
+            ltv_vol["Ebs"][vol_keys[option]] = change["After"]
+
+
+def format_changes(changes):
+    """Formats changes as a single line
+
+    :param changes: Changes, as returned by get_changes
+    :type changes: dict
+    :return: Comma-separated list of 'option: before -> after' items
+    :rtype: string
+    """
+
+    items = []
+    for group in ["LaunchConfiguration", "LaunchTemplate"]:
+        for option, change in changes.get(group, {}).items():
+            items.append(f"{option}: {change['Before']} -> {change['After']}")
+    for dev_name, dev_changes in changes.get("Volumes", {}).items():
+        for option, change in dev_changes.items():
+            items.append(f"{dev_name} {option}: {change['Before']} -> {change['After']}")
+    return ", ".join(items)
+
+
+def select_region(drs_df, region):
+    """Returns the source servers of a Region, for XLS docs listing several Regions
+
+    :param drs_df: DRS related data
+    :type drs_df: pd dataframe
+    :param region: Name of the DR Region
+    :type region: string
+    :return: DRS related data of the Region
+    :rtype: pd dataframe
+    """
+
+    if "Region" not in drs_df.columns:
+        return drs_df
+
+    region_df = drs_df[drs_df["Region"] == region]
+    skipped = len(drs_df) - len(region_df)
+    if skipped:
+        logActions("INF", f"Skipping {skipped} source servers of other Regions than {region}", None)
+    return region_df
+
+
+def create_plan(drs_df, drs_vol_df, mod_df, vol_dfs):
+    """Computes the changes of every source server from the XLS data, without making any API call
 
     :param drs_df: DRS related data
     :type drs_df: list
+    :param drs_vol_df: DRS volume related data
+    :type drs_vol_df: list
     :param mod_df: Modification related data
     :type mod_df: list
     :param vol_dfs: Volume related data
     :type vol_dfs: list
-    :return: True if any update occured, False if otherwise
-    :rtype: boolean
+    :return: Plan entry of every source server, with its targets, its changes or the validation error
+    :rtype: list
     """
-    
-    has_any_updates = False
+
+    mod_rows = mod_df.drop_duplicates("OriginInstanceID").set_index("OriginInstanceID", drop=False)
+    mod_vol_groups = dict(list(vol_dfs.groupby("OriginInstanceID")))
+    drs_vol_groups = dict(list(drs_vol_df.groupby("OriginInstanceID")))
+
+    plan = []
     for index, row in drs_df.iterrows():
+        instance_id = row["OriginInstanceID"]
+        entry = {
+            "SourceServerID": row["SourceServerID"],
+            "SourceServerName": row["SourceServerName"],
+            "OriginInstanceID": instance_id,
+            "TemplateID": row["TemplateID"],
+            "TemplateVersion": normalize_value(row["TemplateVersion"]),
+            "Changes": {},
+            "Error": None,
+        }
         try:
-            new_vols = {}
-            ss_id = row["SourceServerID"]
-            template_id = row["TemplateID"]
-            template_version = row["TemplateVersion"]
-            instance_id = row["OriginInstanceID"]
-            hostname = row["SourceServerName"]
-
-            lc = drs_client.get_launch_configuration(sourceServerID=ss_id)
+            entry["Targets"] = get_mod_targets(
+                mod_rows.loc[instance_id] if instance_id in mod_rows.index else None,
+                mod_vol_groups.get(instance_id, vol_dfs.iloc[0:0]),
+                row["SourceServerName"],
+            )
+            entry["Changes"] = get_changes(
+                get_snapshot_config(row, drs_vol_groups.get(instance_id, drs_vol_df.iloc[0:0])),
+                entry["Targets"],
+            )
+        except Exception as e:
+            entry["Error"] = str(e)
+        plan.append(entry)
 
-            ltv = ec2_client.describe_launch_template_versions(
-                LaunchTemplateId=template_id, Versions=[str(template_version)]
-            )["LaunchTemplateVersions"][0]
+    return plan
 
-            ltv_data = ltv["LaunchTemplateData"]
 
-            new_subnet_id = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_DrsSubnetID"
-            ].squeeze()
-            new_launch_state = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_LaunchState"
-            ].squeeze()
-            new_copy_private_ip = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_CopyPrivateIP"
-            ].squeeze()
-            new_private_ips = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_PrivateIPs"
-            ].squeeze()
-            new_rightsizing = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_RightSizing"
-            ].squeeze()
-            new_instance_type = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_InstanceType"
-            ].squeeze()
-            new_sg_ids = mod_df.loc[
-                mod_df["OriginInstanceID"] == instance_id, "New_SecurityGroupIDs"
-            ].squeeze()
-
-            vol_df = vol_dfs[vol_dfs["OriginInstanceID"] == instance_id]
-            for vol_index, vol_row in vol_df.iterrows():
-                vol_dev_name = vol_row["DRS_DeviceName"]
-                new_vols[vol_dev_name] = {
-                    "NewType": (
-                        vol_row["New_Type"]
-                        if not pd.isnull(vol_row["New_Type"])
-                        else ""
-                    ),
-                    "NewIOPS": (
-                        vol_row["New_IOPS"]
-                        if not pd.isnull(vol_row["New_IOPS"])
-                        else ""
-                    ),
-                    "NewThroughput": (
-                        vol_row["New_Throughput"]
-                        if not pd.isnull(vol_row["New_Throughput"])
-                        else ""
-                    ),
-                }
-
-            lc_modified = False
-            lt_modified = False
-            if not pd.isnull(new_launch_state):
-                new_value = new_launch_state.upper()
-                if new_value not in ["STARTED", "STOPPED"]:
-                    lc_modified = False
-                    lt_modified = False
-                    raise Exception(
-                        f"Invalid new launch state for {hostname}. Valid options: <STARTED|STOPPED>"
-                    )
-                elif lc["launchDisposition"].upper() != new_value:
-                    lc["launchDisposition"] = new_value
-                    lc_modified = True
-
-            if not pd.isnull(new_copy_private_ip):
-                new_value = new_copy_private_ip
-                if str(new_value).upper() not in ["TRUE", "FALSE"]:
-                    lc_modified = False
-                    lt_modified = False
-                    raise Exception(
-                        f"Invalid new copy private IP value for {hostname}. Valid options: <TRUE|FALSE>"
-                    )
-                elif str(lc["copyPrivateIp"]).upper() != str(new_value).upper():
-                    lc["copyPrivateIp"] = bool(new_copy_private_ip)
-                    lc_modified = True
-
-            if not pd.isnull(new_rightsizing):
-                new_value = new_rightsizing.upper()
-                if new_value not in ["NO", "BASIC", "IN_AWS"]:
-                    lc_modified = False
-                    lt_modified = False
-                    raise Exception(
-                        f"Invalid new rightsizing value for {hostname}. Valid options: <NO|BASIC|IN_AWS>"
-                    )
-                else:
-                    if new_value == "NO":
-                        new_value = "NONE"
-                    if lc["targetInstanceTypeRightSizingMethod"].upper() != new_value:
-                        lc["targetInstanceTypeRightSizingMethod"] = new_value
-                        lc_modified = True
-
-            if not pd.isnull(new_subnet_id):
-                if ltv_data["NetworkInterfaces"][0].get("SubnetId", '') != new_subnet_id:
-                    ltv_data["NetworkInterfaces"][0]["SubnetId"] = new_subnet_id
-                    lt_modified = True
+def write_plan(plan, plan_path, region, file_path):
+    """Writes the source servers with changes or errors to a JSON plan file
 
-            if not pd.isnull(new_private_ips):
-                if lc["copyPrivateIp"] != "TRUE":
-                    ip_data = []
-                    ips_array = new_private_ips.split(",")
-                    ip_index = 0
-                    for ip in ips_array:
-                        if ip_index == 0:
-                            is_primary = True
-                        else:
-                            is_primary = False
-                        ip_data.append(
-                            {"Primary": is_primary, "PrivateIpAddress": ip.strip()}
-                        )
-                        ip_index += 1
-                    if (
-                        ltv_data["NetworkInterfaces"][0]["PrivateIpAddresses"]
-                        != ip_data
-                    ):
-                        ltv_data["NetworkInterfaces"][0]["PrivateIpAddresses"] = ip_data
-                        lt_modified = True
-
-            if not pd.isnull(new_sg_ids):
-                old_sgs = ltv_data["NetworkInterfaces"][0].get("Groups", [])
-                old_sgs.sort()
-                sg_array_tmp = new_sg_ids.split(",")
-                sg_array = []
-                for sg in sg_array_tmp:
-                    sg_array.append(sg.strip())
-                sg_array.sort()
-                if old_sgs != sg_array:
-                    ltv_data["NetworkInterfaces"][0]["Groups"] = []
-                    for sg_id in sg_array:
-                        ltv_data["NetworkInterfaces"][0]["Groups"].append(sg_id)
-                    lt_modified = True
+    :param plan: Plan entries, as returned by create_plan
+    :type plan: list
+    :param plan_path: Path to the JSON plan file
+    :type plan_path: string
+    :param region: Name of the DR Region
+    :type region: string
+    :param file_path: Path to the XLS doc the plan was created from
+    :type file_path: string
+    """
 
-            if not pd.isnull(new_instance_type):
-                if lc["targetInstanceTypeRightSizingMethod"].upper() == "NONE":
-                    if ltv_data["InstanceType"] != new_instance_type:
-                        ltv_data["InstanceType"] = new_instance_type
-                        lt_modified = True
-
-            for ltv_vol in ltv_data["BlockDeviceMappings"]:
-                dev_name = ltv_vol["DeviceName"]
-                if new_vols[dev_name]["NewType"] != "":
-                    if (
-                        ltv_vol["Ebs"]["VolumeType"].upper()
-                        != new_vols[dev_name]["NewType"].upper()
-                    ):
-                        ltv_vol["Ebs"]["VolumeType"] = new_vols[dev_name]["NewType"]
-                        lt_modified = True
-                if new_vols[dev_name]["NewIOPS"] != "":
-                    if ltv_vol["Ebs"]["Iops"] != new_vols[dev_name]["NewIOPS"]:
-                        ltv_vol["Ebs"]["Iops"] = int(new_vols[dev_name]["NewIOPS"])
-                        lt_modified = True
-                if new_vols[dev_name]["NewThroughput"] != "":
-                    if (
-                        ltv_vol["Ebs"]["Throughput"]
-                        != new_vols[dev_name]["NewThroughput"]
-                    ):
-                        ltv_vol["Ebs"]["Throughput"] = int(
-                            new_vols[dev_name]["NewThroughput"]
-                        )
-                        lt_modified = True
-
-            for tag_spec in ltv_data["TagSpecifications"]:
-                if tag_spec["ResourceType"] == "instance":
-                    tag_exists = False
-                    for tag in tag_spec["Tags"]:
-                        if tag["Key"] == "protera_status":
-                            tag["Value"] = "newbuild"
-                            tag_exists = True
-                    if not tag_exists:
-                        tag_spec["Tags"].append(
-                            {"Key": "protera_status", "Value": "newbuild"}
-                        )
-                        lt_modified = True
-
-            # Modify the launch template only if modifications were found
-            if lt_modified:
-                new_version_response = ec2_client.create_launch_template_version(
-                    LaunchTemplateId=template_id, LaunchTemplateData=ltv_data
-                )
-                new_version_number = new_version_response["LaunchTemplateVersion"][
-                    "VersionNumber"
-                ]
-                response = ec2_client.modify_launch_template(
-                    LaunchTemplateId=template_id, DefaultVersion=str(new_version_number)
-                )
-                logActions(
-                    "INF", f"Updated launch template for {ss_id} ({hostname})", None
-                )
-            else:
+    try:
+        servers = []
+        for entry in plan:
+            if entry["Error"] is not None:
                 logActions(
-                    "INF",
-                    f"No changes on launch template for {ss_id} ({hostname})",
-                    None,
-                )
-
-            # Modify the launch configuration only if modifications were found
-            if lc_modified:
-                response = drs_client.update_launch_configuration(
-                    sourceServerID=ss_id,
-                    copyPrivateIp=lc["copyPrivateIp"],
-                    targetInstanceTypeRightSizingMethod=lc[
-                        "targetInstanceTypeRightSizingMethod"
-                    ],
-                    launchDisposition=lc["launchDisposition"],
+                    "ERR",
+                    f"Invalid modification for {entry['SourceServerID']} ({entry['SourceServerName']})",
+                    entry["Error"],
                 )
+            elif entry["Changes"]:
                 logActions(
                     "INF",
-                    f"Updated launch configuration for {ss_id} ({hostname})",
+                    f"Planned changes for {entry['SourceServerID']} ({entry['SourceServerName']}): {format_changes(entry['Changes'])}",
                     None,
                 )
             else:
-                logActions(
-                    "INF",
-                    f"No changes on launch configuration for {ss_id} ({hostname})",
-                    None,
-                )
+                continue
+            servers.append({key: value for key, value in entry.items() if key != "Targets"})
 
-            if lc_modified or lt_modified:
-                has_any_updates = True
+        with open(plan_path, "w") as plan_file:
+            json.dump(
+                {
+                    "Region": region,
+                    "Workbook": file_path,
+                    "Created": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "Servers": servers,
+                },
+                plan_file,
+                indent=1,
+            )
 
-        except Exception as e:
-            logActions("ERR", f"Failed to update template for {ss_id} ({hostname})", e)
+        changed = sum(entry["Error"] is None for entry in servers)
+        logActions(
+            "INF",
+            f"Successfully wrote plan ({plan_path}): {changed} of {len(plan)} servers to update, {len(servers) - changed} invalid",
+            None,
+        )
+    except Exception as e:
+        logActions("ERR", f"Failed to write plan ({plan_path})", e)
+        exit(1)
+
+
+def read_plan(plan_path, region):
+    """Reads a JSON plan file and returns the source servers that have changes
+
+    :param plan_path: Path to the JSON plan file
+    :type plan_path: string
+    :param region: Name of the DR Region, must match the region of the plan
+    :type region: string
+    :return: Plan entries to apply, path to the XLS doc the plan was created from
+    :rtype: list, string
+    """
+
+    try:
+        with open(plan_path) as plan_file:
+            plan_data = json.load(plan_file)
+        if plan_data["Region"] != region:
+            raise Exception(
+                f"Plan was created for region {plan_data['Region']}, not {region}"
+            )
+
+        plan = []
+        for entry in plan_data["Servers"]:
+            if entry["Error"] is not None or not entry["Changes"]:
+                continue
+            entry["Targets"] = get_targets_from_changes(entry["Changes"])
+            plan.append(entry)
+
+        logActions(
+            "INF",
+            f"Successfully read plan ({plan_path}): {len(plan)} servers to update",
+            None,
+        )
+        return plan, plan_data["Workbook"]
+    except Exception as e:
+        logActions("ERR", f"Failed to read plan ({plan_path})", e)
+        exit(1)
+
+
+def update_server(entry, drs_client, ec2_client, raw=None, template_version=None):
+    """Makes the modification of the launch template and launch configuration of a single source server
+
+    The changes are computed again against the live configuration. The calls
+    for the server are made in order. Any failure is isolated to that server.
+
+    :param entry: Plan entry of the source server, as returned by create_plan or read_plan
+    :type entry: dict
+    :param drs_client: Boto DRS client
+    :type drs_client: boto_client
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param raw: Raw data stored by parse_drs_info.py, its launch template data is used instead of fetching the template
+    :type raw: dict
+    :param template_version: Launch template version to fetch when raw is not set, defaults to the version of the entry
+    :type template_version: string
+    :return: Outcome of the launch template and launch configuration updates
+    :rtype: dict
+    """
+
+    ss_id = entry["SourceServerID"]
+    hostname = entry["SourceServerName"]
+    result = {
+        "SourceServerID": ss_id,
+        "Hostname": hostname,
+        "LaunchTemplate": "-",
+        "LaunchConfiguration": "-",
+        "Status": "OK",
+    }
+    try:
+        if entry["Error"] is not None:
+            raise Exception(entry["Error"])
+
+        template_id = entry["TemplateID"]
+
+        # The launch configuration is always fetched, the raw data cannot tell
+        # whether it changed since it was parsed
+        lc = drs_client.get_launch_configuration(sourceServerID=ss_id)
+
+        if raw is not None:
+            ltv_data = json.loads(raw["LaunchTemplateData"])
+        else:
+            if template_version is None:
+                template_version = str(entry["TemplateVersion"])
+
+            ltv = ec2_client.describe_launch_template_versions(
+                LaunchTemplateId=template_id, Versions=[template_version]
+            )["LaunchTemplateVersions"][0]
+
+            ltv_data = ltv["LaunchTemplateData"]
+
+        changes = get_changes(get_live_config(lc, ltv_data), entry["Targets"])
+        apply_changes(lc, ltv_data, changes)
+        lc_modified = "LaunchConfiguration" in changes
+        lt_modified = "LaunchTemplate" in changes or "Volumes" in changes
+
+        for tag_spec in ltv_data["TagSpecifications"]:
+            if tag_spec["ResourceType"] == "instance":
+                tag_exists = False
+                for tag in tag_spec["Tags"]:
+                    if tag["Key"] == "protera_status":
+                        tag["Value"] = "newbuild"
+                        tag_exists = True
+                if not tag_exists:
+                    tag_spec["Tags"].append(
+                        {"Key": "protera_status", "Value": "newbuild"}
+                    )
+                    lt_modified = True
+
+        # Modify the launch template only if modifications were found
+        if lt_modified:
+            new_version_response = ec2_client.create_launch_template_version(
+                LaunchTemplateId=template_id, LaunchTemplateData=ltv_data
+            )
+            new_version_number = new_version_response["LaunchTemplateVersion"][
+                "VersionNumber"
+            ]
+            response = ec2_client.modify_launch_template(
+                LaunchTemplateId=template_id, DefaultVersion=str(new_version_number)
+            )
+            result["LaunchTemplate"] = "UPDATED"
+            logActions(
+                "INF", f"Updated launch template for {ss_id} ({hostname})", None
+            )
+        else:
+            result["LaunchTemplate"] = "UNCHANGED"
+            logActions(
+                "INF",
+                f"No changes on launch template for {ss_id} ({hostname})",
+                None,
+            )
+
+        # Modify the launch configuration only if modifications were found
+        if lc_modified:
+            response = drs_client.update_launch_configuration(
+                sourceServerID=ss_id,
+                copyPrivateIp=lc["copyPrivateIp"],
+                targetInstanceTypeRightSizingMethod=lc[
+                    "targetInstanceTypeRightSizingMethod"
+                ],
+                launchDisposition=lc["launchDisposition"],
+            )
+            result["LaunchConfiguration"] = "UPDATED"
+            logActions(
+                "INF",
+                f"Updated launch configuration for {ss_id} ({hostname})",
+                None,
+            )
+        else:
+            result["LaunchConfiguration"] = "UNCHANGED"
+            logActions(
+                "INF",
+                f"No changes on launch configuration for {ss_id} ({hostname})",
+                None,
+            )
+
+    except Exception as e:
+        logActions("ERR", f"Failed to update template for {ss_id} ({hostname})", e)
+        result["Status"] = "FAILED"
+
+    return result
+
+
+def log_update_summary(results):
+    """Logs a summary table with the outcome of the update of each source server
+
+    :param results: Outcomes as returned by update_server
+    :type results: list
+    """
+
+    columns = ["SourceServerID", "Hostname", "LaunchTemplate", "LaunchConfiguration", "Status"]
+    widths = [
+        max([len(column)] + [len(str(result[column])) for result in results])
+        for column in columns
+    ]
+    lines = [
+        "  ".join(column.ljust(width) for column, width in zip(columns, widths)).rstrip()
+    ]
+    for result in results:
+        lines.append(
+            "  ".join(
+                str(result[column]).ljust(width)
+                for column, width in zip(columns, widths)
+            ).rstrip()
+        )
+
+    lt_updated = sum(result["LaunchTemplate"] == "UPDATED" for result in results)
+    lc_updated = sum(result["LaunchConfiguration"] == "UPDATED" for result in results)
+    failed = sum(result["Status"] == "FAILED" for result in results)
+    unchanged = sum(
+        result["Status"] == "OK"
+        and result["LaunchTemplate"] == "UNCHANGED"
+        and result["LaunchConfiguration"] == "UNCHANGED"
+        for result in results
+    )
+    logActions(
+        "INF",
+        f"Update summary: {len(results)} servers, {lt_updated} launch templates updated, {lc_updated} launch configurations updated, {unchanged} unchanged, {failed} failed",
+        None,
+    )
+    with log_lock:
+        print("\n".join(lines))
+
+
+def get_update_sources(plan, raw_details, ec2_client):
+    """Decides which source servers can be updated from the launch template data stored by parse_drs_info.py
+
+    The raw launch template data is used if the default version of the launch
+    template is still the version that was parsed, the other servers fetch it
+    again. The launch configuration is fetched again by update_server either way.
+
+    :param plan: Plan entries of the source servers to update
+    :type plan: list
+    :param raw_details: Raw data keyed by source server ID, as returned by get_raw_details
+    :type raw_details: dict
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :return: Raw data (or None) and template version to fetch (or None) of every plan entry
+    :rtype: list
+    """
+
+    default_versions = {}
+    if raw_details:
+        default_versions = get_default_template_versions(
+            ec2_client,
+            [entry["TemplateID"] for entry in plan if entry["Error"] is None]
+        )
+
+    sources = []
+    for entry in plan:
+        raw = raw_details.get(entry["SourceServerID"])
+        default_version = default_versions.get(entry["TemplateID"])
+        if raw is None or default_version is None:
+            sources.append((None, None))
+        elif (
+            raw["TemplateID"] == entry["TemplateID"]
+            and normalize_value(raw["TemplateVersion"]) == default_version
+            and normalize_value(entry["TemplateVersion"]) == default_version
+        ):
+            sources.append((raw, None))
+        else:
+            logActions(
+                "INF",
+                f"Launch template {entry['TemplateID']} of {entry['SourceServerID']} ({entry['SourceServerName']}) changed since it was parsed (default version {default_version}), fetching it again",
+                None,
+            )
+            sources.append((None, "$Default"))
+
+    reused = sum(raw is not None for raw, template_version in sources)
+    logActions(
+        "INF",
+        f"Reusing parsed launch template data for {reused} of {len(plan)} servers, fetching it for {len(plan) - reused}",
+        None,
+    )
+    return sources
 
-    return has_any_updates
+
+def update_launch_templates(plan, drs_client, ec2_client, workers=1, raw_details=None):
+    """Makes the modification of the launch templates
+
+    :param plan: Plan entries of the source servers to update, as returned by create_plan or read_plan
+    :type plan: list
+    :param drs_client: Boto DRS client
+    :type drs_client: boto_client
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param workers: Number of source servers to update concurrently
+    :type workers: int
+    :param raw_details: Raw data keyed by source server ID, as returned by get_raw_details
+    :type raw_details: dict
+    :return: IDs of the source servers whose launch template or launch configuration was updated
+    :rtype: list
+    """
+    
+    sources = get_update_sources(plan, raw_details or {}, ec2_client)
+
+    # Each worker runs the whole call chain of a server, results keep the order of the plan
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(
+            executor.map(
+                lambda item: update_server(item[0], drs_client, ec2_client, *item[1]),
+                zip(plan, sources),
+            )
+        )
+
+    log_update_summary(results)
+    return [
+        result["SourceServerID"]
+        for result in results
+        if result["LaunchTemplate"] == "UPDATED" or result["LaunchConfiguration"] == "UPDATED"
+    ]
 
 
-def fetch_updated_data(file_path, region):
-    """Retrieves updated DRS data and re-populates the data on the XLS doc
+def refresh_updated_servers(file_path, ss_ids, drs_client, ec2_client, workers=1, region=None):
+    """Parses the DRS data of the updated source servers again and patches their rows into the XLS doc
+
+    Only the given servers are described again, with the clients already
+    created. Their rows in the List, DRS and Mod sheets are replaced, custom
+    values on the Mod sheets are carried over.
 
     :param file_path: Path to the XLS doc
     :type file_path: string
-    :param region: AWS region
+    :param ss_ids: IDs of the updated source servers
+    :type ss_ids: list
+    :param drs_client: Boto DRS client
+    :type drs_client: boto_client
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param workers: Number of source servers to parse concurrently
+    :type workers: int
+    :param region: AWS Region of the clients
     :type region: string
+    :return: Refreshed DRS_Details and DRS_Vol_Details data
+    :rtype: pd dataframe, pd dataframe
     """
     
     try:
-        subprocess.run(
-            [
-                sys.executable,
-                "parse_drs_info.py",
-                "--workbook-path",
-                file_path,
-                "--region",
-                region,
-                "--additional-exec"
-            ]
+        # Keep the security group layout chosen when parse_drs_info.py was executed
+        normalize_sg_rules = "DRS_Instance_SGs" in get_sheet_names(file_path)
+        sg_sheets = ["DRS_Instance_SGs", "DRS_SG_Rules"] if normalize_sg_rules else ["DRS_SG_Details"]
+        optional_sheets = [
+            "DRS_Raw_Details",
+            "Mod_TemplateConfigs",
+            "Mod_VolumeConfigs",
+        ]
+        sheets = load_sheets(
+            file_path,
+            {
+                sheet_name: None
+                for sheet_name in ["List", "DRS_Details", "DRS_Vol_Details", *sg_sheets, *optional_sheets]
+            },
+            optional_sheets=[*sg_sheets, *optional_sheets],
+        )
+
+        list_df = sheets["List"]
+        # XLS docs listing several Regions tag every row with its Region
+        if "Region" not in list_df.columns:
+            region = None
+        source_server_list, drs_details, drs_vol_details, drs_sg_details, drs_raw_details = parse_drs_info.get_drs_details(
+            list_df[list_df["SourceServerID"].isin(ss_ids)],
+            drs_client,
+            ec2_client,
+            workers,
+            normalize_sg_rules,
+            region,
         )
+        # Servers that failed to parse keep their previous rows
+        parsed_ss_ids = [item["SourceServerID"] for item in drs_details]
+        parsed_instance_ids = [item["OriginInstanceID"] for item in drs_details]
+
+        updated = {
+            "List": patch_rows(list_df, pd.DataFrame(source_server_list), "SourceServerID", parsed_ss_ids),
+            "DRS_Details": patch_rows(sheets["DRS_Details"], pd.DataFrame(drs_details), "SourceServerID", parsed_ss_ids),
+            "DRS_Vol_Details": patch_rows(sheets["DRS_Vol_Details"], pd.DataFrame(drs_vol_details), "OriginInstanceID", parsed_instance_ids),
+            "DRS_Raw_Details": patch_rows(sheets["DRS_Raw_Details"], pd.DataFrame(drs_raw_details), "SourceServerID", parsed_ss_ids),
+        }
+        if normalize_sg_rules:
+            drs_sg_rules = pd.DataFrame(
+                get_normalized_sg_rules(drs_sg_details, parse_drs_info.security_group_cache)
+            )
+            if region is not None and not drs_sg_rules.empty:
+                drs_sg_rules["Region"] = region
+            updated["DRS_Instance_SGs"] = patch_rows(sheets["DRS_Instance_SGs"], pd.DataFrame(drs_sg_details), "OriginInstanceID", parsed_instance_ids)
+            updated["DRS_SG_Rules"] = patch_rows(
+                sheets["DRS_SG_Rules"],
+                drs_sg_rules,
+                "SecurityGroupID",
+                drs_sg_rules["SecurityGroupID"].unique() if not drs_sg_rules.empty else [],
+            )
+        else:
+            updated["DRS_SG_Details"] = patch_rows(sheets["DRS_SG_Details"], pd.DataFrame(drs_sg_details), "OriginInstanceID", parsed_instance_ids)
         logActions(
             "INF",
-            f"Successfully stored updated data for DRS on spreadsheet ({file_path})",
+            f"Successfully refreshed DRS data for {len(parsed_ss_ids)} of {len(ss_ids)} updated servers",
             None,
         )
-        subprocess.run(
-            [sys.executable, "create_mod_sheets.py", "--workbook-path", file_path]
+
+        # Only the EC2 data of the refreshed servers is compared, read with keyed lookups
+        ec2_sheets = load_sheets(
+            file_path,
+            {"EC2_Details": None, "EC2_Vol_Details": None},
+            optional_sheets=["EC2_Details", "EC2_Vol_Details"],
+            keys={
+                "EC2_Details": ("InstanceID", parsed_instance_ids),
+                "EC2_Vol_Details": ("InstanceID", parsed_instance_ids),
+            },
+        )
+        refreshed_list_df = updated["List"][updated["List"]["OriginInstanceID"].isin(parsed_instance_ids)]
+        gnrl_data, vol_data = create_mod_sheets.create_comparison_data(
+            refreshed_list_df,
+            updated["DRS_Details"],
+            ec2_sheets["EC2_Details"],
+            updated["DRS_Vol_Details"],
+            ec2_sheets["EC2_Vol_Details"],
+            sheets["Mod_TemplateConfigs"],
+            sheets["Mod_VolumeConfigs"],
         )
+        updated["Mod_TemplateConfigs"] = patch_rows(sheets["Mod_TemplateConfigs"], gnrl_data, "OriginInstanceID", parsed_instance_ids)
+        updated["Mod_VolumeConfigs"] = patch_rows(sheets["Mod_VolumeConfigs"], vol_data, "OriginInstanceID", parsed_instance_ids)
+
+        modified = write_sheets(file_path, updated)
         logActions(
             "INF",
-            f"Successfully created updated mod sheets on XLS document ({file_path})",
+            f"Successfully stored updated data on XLS document ({file_path}), modified sheets: {', '.join(modified) or 'none'}",
             None,
         )
+        return updated["DRS_Details"], updated["DRS_Vol_Details"]
     except Exception as e:
         logActions(
             "ERR",
             f"Failed to update the XLS document with the updated data ({file_path})",
             e,
         )
+        return None, None
+
+def comparable_values(column):
+    """Returns the values of a column in a form that compares equal across XLS reads and API data
+
+    :param column: Column values
+    :type column: pd series
+    :return: Values with empty cells as empty strings and integral floats as integers
+    :rtype: pd series
+    """
+
+    return column.map(normalize_value).map(lambda value: "" if value is None else value)
+
+
+def compare_snapshots(init_df, latest_df, keys, id_columns, columns, sheet_name):
+    """Joins the initial and the latest rows on their keys and compares them column by column
+
+    :param init_df: Initial data
+    :type init_df: pd dataframe
+    :param latest_df: Latest data
+    :type latest_df: pd dataframe
+    :param keys: Columns identifying a row
+    :type keys: list
+    :param id_columns: Columns copied from the initial data, keys included
+    :type id_columns: list
+    :param columns: Compared columns
+    :type columns: list
+    :param sheet_name: Comparison sheet name, used for reporting
+    :type sheet_name: string
+    :return: Identifying columns, Init_/New_ pair of every compared column, the names of the changed columns and the Region if the initial data has one
+    :rtype: pd dataframe
+    """
+
+    # XLS docs listing several Regions carry the Region of every row, as the last column
+    region_columns = ["Region"] if "Region" in init_df.columns else []
+    latest_df = latest_df[[*keys, *columns]]
+    duplicated = latest_df.duplicated(subset=keys, keep="first")
+    if duplicated.any():
+        logActions(
+            "ERR",
+            f"{duplicated.sum()} duplicate rows in the latest data for {sheet_name}, only the first row of each is compared",
+            None,
+        )
+        latest_df = latest_df[~duplicated]
+
+    merged = init_df[[*id_columns, *columns, *region_columns]].merge(
+        latest_df.rename(columns={column: f"New_{column}" for column in columns}),
+        on=keys,
+        how="left",
+        validate="many_to_one",
+    )
+
+    diff_df = merged[id_columns].copy()
+    changed_fields = pd.Series("", index=merged.index)
+    for column in columns:
+        diff_df[f"Init_{column}"] = merged[column]
+        diff_df[f"New_{column}"] = merged[f"New_{column}"]
+        changed = comparable_values(merged[column]) != comparable_values(merged[f"New_{column}"])
+        changed_fields = changed_fields.where(
+            ~changed, changed_fields + (changed_fields != "").map({True: ", ", False: ""}) + column
+        )
+    diff_df["ChangedFields"] = changed_fields
+    for column in region_columns:
+        diff_df[column] = merged[column]
+    return diff_df
+
 
-def create_prepost_sheets(file_path):
+def create_prepost_sheets(file_path, latest_drs_df=None, latest_vol_df=None, only_changed=False):
     """Creates or updates the sheets that contain the comparison data between initial and current state of DRS configs
 
+    Servers are matched by SourceServerID, volumes by OriginInstanceID and DeviceName.
+
     :param file_path: Path to the XLS doc
     :type file_path: string
+    :param latest_drs_df: Current DRS data, read from the XLS doc if not set
+    :type latest_drs_df: pd dataframe
+    :param latest_vol_df: Current DRS volume data, read from the XLS doc if not set
+    :type latest_vol_df: pd dataframe
+    :param only_changed: Only keep the rows with at least one changed column
+    :type only_changed: bool
     """
     
     try:
-        init_drs_df = pd.read_excel(file_path, sheet_name="Initial_DRS_Details")
-        init_vol_df = pd.read_excel(file_path, sheet_name="Initial_DRS_Vol_Details")
-        latest_drs_df = pd.read_excel(file_path, sheet_name="DRS_Details")
-        latest_vol_df = pd.read_excel(file_path, sheet_name="DRS_Vol_Details")
-        
-        drs_diff = []
-        for index, init_row in init_drs_df.iterrows():
-            item = {
-                'SourceServerName': init_row['SourceServerName'],
-                'OriginInstanceID': init_row['OriginInstanceID'],
-                'SourceServerID': init_row['SourceServerID'],
-                'Init_TemplateID': init_row['TemplateID'],
-                'New_TemplateID': latest_drs_df['TemplateID'][index],
-                'Init_TemplateVersion': init_row['TemplateVersion'],
-                'New_TemplateVersion': latest_drs_df['TemplateVersion'][index],
-                'Init_LaunchState': init_row['LaunchState'],
-                'New_LaunchState': latest_drs_df['LaunchState'][index],
-                'Init_CopyPrivateIP': init_row['CopyPrivateIP'],
-                'New_CopyPrivateIP': latest_drs_df['CopyPrivateIP'][index],
-                'Init_Rightsizing': init_row['Rightsizing'],
-                'New_Rightsizing': latest_drs_df['Rightsizing'][index],
-                'Init_InstanceType': init_row['InstanceType'],
-                'New_InstanceType': latest_drs_df['InstanceType'][index],
-                'Init_SubnetName': init_row['SubnetName'],
-                'New_SubnetName': latest_drs_df['SubnetName'][index],
-                'Init_PrivateIPs': init_row['PrivateIPs'],
-                'New_PrivateIPs': latest_drs_df['PrivateIPs'][index],
-                'Init_SecurityGroupNames': init_row['SecurityGroupNames'],
-                'New_SecurityGroupNames': latest_drs_df['SecurityGroupNames'][index]
-            }
-            drs_diff.append(item)
-        
-        drs_vol_diff = []
-        for index, init_row in init_vol_df.iterrows():
-            item = {
-                'Hostname': init_row['Hostname'],
-                'OriginInstanceID': init_row['OriginInstanceID'],
-                'DeviceName': init_row['DeviceName'],
-                'Init_Type': init_row['Type'],
-                'New_Type': latest_vol_df['Type'][index],
-                'Init_Size': init_row['Size'],
-                'New_Size': latest_vol_df['Size'][index],
-                'Init_IOPS': init_row['IOPS'],
-                'New_IOPS': latest_vol_df['IOPS'][index],
-                'Init_Throughput': init_row['Throughput'],
-                'New_Throughput': latest_vol_df['Throughput'][index]
-            }
-            drs_vol_diff.append(item)
-            
-        drs_diff_df = pd.DataFrame(drs_diff)
-        drs_vol_diff_df = pd.DataFrame(drs_vol_diff)
-        with pd.ExcelWriter(
-            file_path, engine="openpyxl", mode="a", if_sheet_exists="replace"
-        ) as writer:
-            drs_diff_df.to_excel(writer, sheet_name="DRS_Diff", index=False)
-            drs_vol_diff_df.to_excel(writer, sheet_name="DRS_Volume_Diff", index=False)
+        sheet_names = ["Initial_DRS_Details", "Initial_DRS_Vol_Details"]
+        if latest_drs_df is None or latest_vol_df is None:
+            sheet_names += ["DRS_Details", "DRS_Vol_Details"]
+        sheets = load_sheets(file_path, {sheet_name: None for sheet_name in sheet_names})
+        init_drs_df = sheets["Initial_DRS_Details"]
+        init_vol_df = sheets["Initial_DRS_Vol_Details"]
+        if latest_drs_df is None or latest_vol_df is None:
+            latest_drs_df = sheets["DRS_Details"]
+            latest_vol_df = sheets["DRS_Vol_Details"]
+
+        drs_diff_df = compare_snapshots(
+            init_drs_df,
+            latest_drs_df,
+            ["SourceServerID"],
+            ["SourceServerName", "OriginInstanceID", "SourceServerID"],
+            [
+                "TemplateID",
+                "TemplateVersion",
+                "LaunchState",
+                "CopyPrivateIP",
+                "Rightsizing",
+                "InstanceType",
+                "SubnetName",
+                "PrivateIPs",
+                "SecurityGroupNames",
+            ],
+            "DRS_Diff",
+        )
+        drs_vol_diff_df = compare_snapshots(
+            init_vol_df,
+            latest_vol_df,
+            ["OriginInstanceID", "DeviceName"],
+            ["Hostname", "OriginInstanceID", "DeviceName"],
+            ["Type", "Size", "IOPS", "Throughput"],
+            "DRS_Volume_Diff",
+        )
+
+        if only_changed:
+            drs_diff_df = drs_diff_df[drs_diff_df["ChangedFields"] != ""]
+            drs_vol_diff_df = drs_vol_diff_df[drs_vol_diff_df["ChangedFields"] != ""]
+
+        write_sheets(
+            file_path,
+            {"DRS_Diff": drs_diff_df, "DRS_Volume_Diff": drs_vol_diff_df},
+        )
+        logActions(
+            "INF",
+            f"Successfully updated the XLS document with the DRS comparison data ({file_path}): {(drs_diff_df['ChangedFields'] != '').sum()} servers and {(drs_vol_diff_df['ChangedFields'] != '').sum()} volumes changed",
+            None,
+        )
             
     except Exception as e:
         logActions(
@@ -431,27 +1134,68 @@ def create_prepost_sheets(file_path):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
+    parser.add_argument(
+        "action",
+        nargs="?",
+        choices=["plan", "apply"],
+        default="apply",
+        help="'plan' writes the changes to a JSON plan file without making any API call, 'apply' (default) performs them",
+    )
     parser.add_argument(
         "--region", type=str, required=True, help="Name of the DR Region"
     )
     parser.add_argument(
-        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+        "--workbook-path", type=str, required=False, help="Path to the XLSX file, or to a SQLite state file (.db)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of source servers to update concurrently"
+    )
+    parser.add_argument(
+        "--only-changed-diff", action="store_true", help="Only write the servers and volumes that changed to the DRS_Diff and DRS_Volume_Diff sheets"
+    )
+    parser.add_argument(
+        "--plan", type=str, required=False, help="Path to the JSON plan file. Written by 'plan' (defaults to './DRS_Plan.json'), applied instead of the XLS data by 'apply'"
     )
     # Parse the arguments
     args = parser.parse_args()
     region = args.region
     file_path = args.workbook_path
+    workers = args.workers
+    plan_path = args.plan
 
-    # Not providing '--workbook-path' option defaults in './DRS_Templates.xlsx'
-    if file_path == None:
-        file_path = "DRS_Templates.xlsx"
+    if workers < 1:
+        logActions("ERR", "Invalid number of workers. It must be at least 1", None)
+        exit(1)
 
-    drs_client, ec2_client = init_aws_clients(region)
-    drs_df, mod_df, vol_dfs = get_excel_data(file_path)
-    has_any_updates = update_launch_templates(drs_df, mod_df, vol_dfs)
+    if args.action == "apply" and plan_path != None:
+        plan, plan_file_path = read_plan(plan_path, region)
+        # The XLS doc the plan was created from gets the refreshed data
+        if file_path == None:
+            file_path = plan_file_path
+    else:
+        # Not providing '--workbook-path' option defaults in './DRS_Templates.xlsx'
+        if file_path == None:
+            file_path = "DRS_Templates.xlsx"
+        drs_df, drs_vol_df, mod_df, vol_dfs = get_excel_data(file_path)
+        plan = create_plan(select_region(drs_df, region), drs_vol_df, mod_df, vol_dfs)
+
+    if args.action == "plan":
+        # Not providing '--plan' option defaults in './DRS_Plan.json'
+        if plan_path == None:
+            plan_path = "DRS_Plan.json"
+        write_plan(plan, plan_path, region, file_path)
+        logActions("INF", f"Execution finished", None)
+        exit(0)
+
+    drs_client, ec2_client = init_aws_clients(region, workers)
+    raw_details = get_raw_details(file_path, [entry["SourceServerID"] for entry in plan])
+    updated_ss_ids = update_launch_templates(plan, drs_client, ec2_client, workers, raw_details)
     
     # If any launch configuration or launch template was modified, fetch the updated data and update XLS
-    if has_any_updates:
-        fetch_updated_data(file_path, region)
-        create_prepost_sheets(file_path)
+    if updated_ss_ids:
+        latest_drs_df, latest_vol_df = refresh_updated_servers(
+            file_path, updated_ss_ids, drs_client, ec2_client, workers, region
+        )
+        create_prepost_sheets(file_path, latest_drs_df, latest_vol_df, args.only_changed_diff)
+    logActions("INF", rate_controller.get_summary(), None)
     logActions("INF", f"Execution finished", None)
@@ -1,40 +1,44 @@
 import pandas as pd
-import boto3
 import argparse
-import datetime
-
-
-def logActions(level, short_desc, long_desc):
-    """Formats and prints logs
-
-    :param level: Log level (INF,ERR)
-    :type level: string
-    :param short_desc: Short log message
-    :type short_desc: string
-    :param long_desc: Long log message
-    :type long_desc: string
-    """
-    
-    dt_object = datetime.datetime.now()
-    dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
-    prefix = f"{dt_string} - {level}:"
-    print(f"{prefix} {short_desc}")
-    if long_desc:
-        print(f"{prefix} {long_desc}")
-
-
-def init_aws_clients(region):
+import json
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from aws_utils import get_client, get_normalized_sg_rules, get_sg_rules, rate_controller
+from checkpoint_utils import Journal, get_journal_path, handle_interrupts, remove_journal, stop_requested
+from log_utils import logActions
+from workbook_utils import load_sheets, patch_rows, write_sheets
+
+# Maximum number of IDs accepted by the sourceServerIDs filter of describe_source_servers
+SOURCE_SERVER_ID_BATCH_SIZE = 200
+
+# Number of AWS API calls made during the run, keyed by operation name
+api_call_counts = Counter()
+api_call_counts_lock = threading.Lock()
+
+# Run-scoped caches of subnets and security groups, keyed by resource ID
+subnet_cache = {}
+security_group_cache = {}
+resource_cache_stats = Counter()
+resource_cache_lock = threading.Lock()
+# Events of the resource IDs being described, set once their describe call returns
+resource_cache_in_flight = {}
+
+
+def init_aws_clients(region, workers=1):
     """Initializes EC2 boto clients
 
     :param region: AWS Region
     :type region: string
+    :param workers: Number of worker threads sharing the clients
+    :type workers: int
     :return: DRS client, EC2 client
     :rtype: boto_client, boto_client
     """
     
     try:
-        drs_client = boto3.client("drs", region_name=region)
-        ec2_client = boto3.client("ec2", region_name=region)
+        drs_client = get_client("drs", region, workers)
+        ec2_client = get_client("ec2", region, workers)
 
         logActions("INF", "Successfully created AWS clients", None)
         return drs_client, ec2_client
@@ -53,7 +57,7 @@ def read_excel(file_path):
     """
     
     try:
-        df = pd.read_excel(file_path, sheet_name="List")
+        df = load_sheets(file_path, {"List": ["SourceServerID", "Region"]})["List"]
         logActions("INF", f"Successfully parsed XLS document ({file_path})", None)
         return df
     except Exception as e:
@@ -61,266 +65,547 @@ def read_excel(file_path):
         exit(1)
 
 
-def get_drs_details(df, drs_client, ec2_client):
-    """Returns all info related to DRS source servers
+def count_api_call(operation):
+    """Increments the call counter of an AWS API operation
 
-    :param df: Source server list
-    :type df: list
-    :param drs_client: DRS boto client
-    :type drs_client: boto_client
+    :param operation: Operation name
+    :type operation: string
+    """
+
+    with api_call_counts_lock:
+        api_call_counts[operation] += 1
+
+
+def log_api_call_counts():
+    """Prints the number of AWS API calls made per operation"""
+
+    for operation, count in sorted(api_call_counts.items()):
+        logActions("INF", f"API calls to {operation}: {count}", None)
+
+
+def get_cached_resources(resource_ids, cache, fetch):
+    """Returns resources from a run-scoped cache, fetching all uncached IDs with a single call
+
+    :param resource_ids: Resource IDs
+    :type resource_ids: list
+    :param cache: Cache to look up and populate, keyed by resource ID
+    :type cache: dict
+    :param fetch: Function that describes a list of resource IDs and returns them keyed by ID
+    :type fetch: function
+    :return: Resources in the order of resource_ids
+    :rtype: list
+    """
+
+    # Each missing ID is described by the first worker that misses on it, outside
+    # the lock. Other workers missing on the same ID wait for its event, while
+    # workers looking up other IDs are not blocked
+    first_lookup = True
+    fetched_ids = set()
+    while True:
+        with resource_cache_lock:
+            missing_ids = []
+            pending_events = []
+            for resource_id in dict.fromkeys(resource_ids):
+                if resource_id in cache or resource_id in fetched_ids:
+                    continue
+                event = resource_cache_in_flight.get(resource_id)
+                if event is None:
+                    resource_cache_in_flight[resource_id] = threading.Event()
+                    missing_ids.append(resource_id)
+                elif event not in pending_events:
+                    pending_events.append(event)
+            if first_lookup:
+                resource_cache_stats["hits"] += len(resource_ids) - len(missing_ids)
+                resource_cache_stats["misses"] += len(missing_ids)
+                first_lookup = False
+            if not missing_ids and not pending_events:
+                return [cache[resource_id] for resource_id in resource_ids]
+
+        if missing_ids:
+            fetched_ids.update(missing_ids)
+            try:
+                resources = fetch(missing_ids)
+                with resource_cache_lock:
+                    cache.update(resources)
+            finally:
+                with resource_cache_lock:
+                    for resource_id in missing_ids:
+                        resource_cache_in_flight.pop(resource_id).set()
+
+        # IDs whose describe call failed in another worker are described again
+        for event in pending_events:
+            event.wait()
+
+
+def get_subnets(subnet_ids, ec2_client):
+    """Returns subnet details, describing each subnet only once per run
+
+    :param subnet_ids: Subnet IDs
+    :type subnet_ids: list
     :param ec2_client: EC2 boto client
     :type ec2_client: boto_client
-    :return: ss_list, ss_total_info, volumes, security_rules
-    :rtype: list, list, list, list
+    :return: Subnets in the order of subnet_ids
+    :rtype: list
     """
-    
-    ss_list = []
-    ss_total_info = []
-    volumes = []
-    security_rules = []
-    for ss_id in df["SourceServerID"]:
-        ss_volumes = []
-        ss_info = {}
 
-        try:
-            ss = drs_client.describe_source_servers(
-                filters={"sourceServerIDs": [ss_id]}
-            )
-            source_instance_id = ss["items"][0]["sourceProperties"][
-                "identificationHints"
-            ]["awsInstanceID"]
-            source_instance_name = ss["items"][0]["tags"]["Name"]
+    def fetch(missing_ids):
+        response = ec2_client.describe_subnets(SubnetIds=missing_ids)
+        count_api_call("describe_subnets")
+        return {subnet["SubnetId"]: subnet for subnet in response["Subnets"]}
+
+    return get_cached_resources(subnet_ids, subnet_cache, fetch)
+
+
+def get_security_groups(sg_ids, ec2_client):
+    """Returns security group details, describing each group only once per run
+
+    :param sg_ids: Security group IDs
+    :type sg_ids: list
+    :param ec2_client: EC2 boto client
+    :type ec2_client: boto_client
+    :return: Security groups in the order of sg_ids
+    :rtype: list
+    """
 
-            lc = drs_client.get_launch_configuration(sourceServerID=ss_id)
-            lt_id = lc["ec2LaunchTemplateID"]
+    def fetch(missing_ids):
+        response = ec2_client.describe_security_groups(GroupIds=missing_ids)
+        count_api_call("describe_security_groups")
+        return {sg["GroupId"]: sg for sg in response["SecurityGroups"]}
 
-            lt = ec2_client.describe_launch_templates(LaunchTemplateIds=[lt_id])
-            default_lt_version = lt["LaunchTemplates"][0]["DefaultVersionNumber"]
+    return get_cached_resources(sg_ids, security_group_cache, fetch)
 
-            lt_data = ec2_client.describe_launch_template_versions(
-                LaunchTemplateId=lt_id, Versions=[str(default_lt_version)]
-            )["LaunchTemplateVersions"][0]["LaunchTemplateData"]
 
-            instance_type = lt_data["InstanceType"]
+def log_resource_cache_stats():
+    """Prints the hit rate of the subnet and security group cache"""
+
+    hits = resource_cache_stats["hits"]
+    lookups = hits + resource_cache_stats["misses"]
+    hit_rate = hits / lookups * 100 if lookups else 0
+    logActions(
+        "INF",
+        f"Subnet/Security group cache: {hits} hits out of {lookups} lookups ({hit_rate:.1f}% hit rate)",
+        None,
+    )
 
-            subnet_id = lt_data["NetworkInterfaces"][0].get("SubnetId", '')
-            if subnet_id != '':
-                subnet = ec2_client.describe_subnets(SubnetIds=[subnet_id])
-                subnet_tags = subnet["Subnets"][0].get("Tags", [])
-                subnet_name = next(
-                    (tag["Value"] for tag in subnet_tags if tag["Key"] == "Name"), subnet_id
-                )
-            else:
-                subnet_name = "N/A"
-            sg_ids = lt_data["NetworkInterfaces"][0].get("Groups", [])
-            sg_names = []
-            for sg_id in sg_ids:
-                sg = ec2_client.describe_security_groups(GroupIds=[sg_id])
-                sg_tags = sg["SecurityGroups"][0].get("Tags", [])
-                sg_name = next(
-                    (tag["Value"] for tag in sg_tags if tag["Key"] == "Name"), sg_id
-                )
-                    
-                sg_names.append(sg_name)
 
-            private_ips = [
-                addr["PrivateIpAddress"]
-                for nic in lt_data.get("NetworkInterfaces", [])
-                for addr in nic.get("PrivateIpAddresses", [])
-            ]
+def get_source_servers(ss_ids, drs_client):
+    """Fetches the targeted source servers in batches and indexes them by ID
 
-            ss_info = {
-                "SourceServerName": source_instance_name,
+    :param ss_ids: Source server IDs
+    :type ss_ids: list
+    :param drs_client: DRS boto client
+    :type drs_client: boto_client
+    :return: Source servers keyed by source server ID
+    :rtype: dict
+    """
+
+    ss_index = {}
+    unique_ids = list(dict.fromkeys(ss_ids))
+    paginator = drs_client.get_paginator("describe_source_servers")
+
+    for i in range(0, len(unique_ids), SOURCE_SERVER_ID_BATCH_SIZE):
+        batch = unique_ids[i : i + SOURCE_SERVER_ID_BATCH_SIZE]
+        try:
+            for page in paginator.paginate(filters={"sourceServerIDs": batch}):
+                count_api_call("describe_source_servers")
+                for server in page.get("items", []):
+                    ss_index[server["sourceServerID"]] = server
+        except Exception as e:
+            logActions(
+                "ERR",
+                f"Failed to fetch source servers {batch[0]} to {batch[-1]}",
+                e,
+            )
+
+    logActions(
+        "INF",
+        f"Fetched {len(ss_index)} of {len(unique_ids)} targeted source servers",
+        None,
+    )
+    return ss_index
+
+
+def get_server_details(ss_id, ss, drs_client, ec2_client, normalize_sg_rules=False):
+    """Returns all info related to a single DRS source server
+
+    :param ss_id: Source server ID
+    :type ss_id: string
+    :param ss: Source server as returned by describe_source_servers
+    :type ss: dict
+    :param drs_client: DRS boto client
+    :type drs_client: boto_client
+    :param ec2_client: EC2 boto client
+    :type ec2_client: boto_client
+    :param normalize_sg_rules: Return security group mappings instead of per-server rules
+    :type normalize_sg_rules: bool
+    :return: ss_list_item, ss_info, ss_volumes, ss_security_rules, ss_raw
+    :rtype: dict, dict, list, list, dict
+    """
+
+    ss_volumes = []
+    ss_security_rules = []
+
+    source_instance_id = ss["sourceProperties"][
+        "identificationHints"
+    ]["awsInstanceID"]
+    source_instance_name = ss["tags"]["Name"]
+
+    lc = drs_client.get_launch_configuration(sourceServerID=ss_id)
+    count_api_call("get_launch_configuration")
+    lt_id = lc["ec2LaunchTemplateID"]
+
+    # '$Default' resolves the default version server-side, so there is
+    # no need to look up DefaultVersionNumber with describe_launch_templates
+    ltv = ec2_client.describe_launch_template_versions(
+        LaunchTemplateId=lt_id, Versions=["$Default"]
+    )["LaunchTemplateVersions"][0]
+    count_api_call("describe_launch_template_versions")
+    default_lt_version = ltv["VersionNumber"]
+    lt_data = ltv["LaunchTemplateData"]
+
+    instance_type = lt_data["InstanceType"]
+
+    subnet_id = lt_data["NetworkInterfaces"][0].get("SubnetId", '')
+    if subnet_id != '':
+        subnet = get_subnets([subnet_id], ec2_client)[0]
+        subnet_tags = subnet.get("Tags", [])
+        subnet_name = next(
+            (tag["Value"] for tag in subnet_tags if tag["Key"] == "Name"), subnet_id
+        )
+    else:
+        subnet_name = "N/A"
+    sg_ids = lt_data["NetworkInterfaces"][0].get("Groups", [])
+    sg_names = []
+    security_groups = get_security_groups(sg_ids, ec2_client)
+    for sg_id, sg in zip(sg_ids, security_groups):
+        sg_tags = sg.get("Tags", [])
+        sg_name = next(
+            (tag["Value"] for tag in sg_tags if tag["Key"] == "Name"), sg_id
+        )
+
+        sg_names.append(sg_name)
+
+    private_ips = [
+        addr["PrivateIpAddress"]
+        for nic in lt_data.get("NetworkInterfaces", [])
+        for addr in nic.get("PrivateIpAddresses", [])
+    ]
+
+    ss_info = {
+        "SourceServerName": source_instance_name,
+        "OriginInstanceID": source_instance_id,
+        "SourceServerID": ss_id,
+        "CopyPrivateIP": lc["copyPrivateIp"],
+        "CopyTags": lc["copyTags"],
+        "TemplateID": lt_id,
+        "TemplateVersion": default_lt_version,
+        "LaunchState": lc["launchDisposition"],
+        "Rightsizing": lc["targetInstanceTypeRightSizingMethod"],
+        "InstanceType": instance_type,
+        "SubnetName": subnet_name,
+        "SubnetID": subnet_id,
+        "PrivateIPs": ", ".join(private_ips),
+        "SecurityGroupIDs": ", ".join(sg_ids),
+        "SecurityGroupNames": ", ".join(sg_names),
+    }
+
+    for vol in lt_data["BlockDeviceMappings"]:
+        ss_volumes.append(
+            {
+                "Hostname": source_instance_name,
                 "OriginInstanceID": source_instance_id,
-                "SourceServerID": ss_id,
-                "CopyPrivateIP": lc["copyPrivateIp"],
-                "CopyTags": lc["copyTags"],
-                "TemplateID": lt_id,
-                "TemplateVersion": default_lt_version,
-                "LaunchState": lc["launchDisposition"],
-                "Rightsizing": lc["targetInstanceTypeRightSizingMethod"],
-                "InstanceType": instance_type,
-                "SubnetName": subnet_name,
-                "SubnetID": subnet_id,
-                "PrivateIPs": ", ".join(private_ips),
-                "SecurityGroupIDs": ", ".join(sg_ids),
-                "SecurityGroupNames": ", ".join(sg_names),
+                "DeviceName": vol["DeviceName"],
+                "Type": vol["Ebs"]["VolumeType"],
+                "Size": vol["Ebs"]["VolumeSize"],
+                "IOPS": vol["Ebs"]["Iops"],
+                "Throughput": vol["Ebs"]["Throughput"],
             }
-            
-            ss_total_info.append(ss_info)
+        )
+
+    ss_volumes = sorted(ss_volumes, key=lambda x: x["Size"])
 
-            for vol in lt_data["BlockDeviceMappings"]:
-                ss_volumes.append(
+    # Collect security group details
+    for sg_id, sg_details in zip(sg_ids, security_groups):
+        if normalize_sg_rules:
+            # Rules are flattened once per group into the SG rules sheet
+            ss_security_rules.append(
+                {
+                    "Hostname": source_instance_name,
+                    "OriginInstanceID": source_instance_id,
+                    "SecurityGroupName": next(
+                        (
+                            tag["Value"]
+                            for tag in sg_details.get("Tags", [])
+                            if tag["Key"] == "Name"
+                        ),
+                        "",
+                    ),
+                    "SecurityGroupID": sg_id,
+                }
+            )
+        else:
+            for sg_rule in get_sg_rules(sg_id, sg_details):
+                ss_security_rules.append(
                     {
                         "Hostname": source_instance_name,
                         "OriginInstanceID": source_instance_id,
-                        "DeviceName": vol["DeviceName"],
-                        "Type": vol["Ebs"]["VolumeType"],
-                        "Size": vol["Ebs"]["VolumeSize"],
-                        "IOPS": vol["Ebs"]["Iops"],
-                        "Throughput": vol["Ebs"]["Throughput"],
+                        **sg_rule,
                     }
                 )
 
-            ss_volumes = sorted(ss_volumes, key=lambda x: x["Size"])
-            volumes.extend(ss_volumes)
+    ss_list_item = {
+        "Hostname": source_instance_name,
+        "SourceServerID": ss_id,
+        "OriginInstanceID": source_instance_id,
+        "OriginAccountID": ss["sourceCloudProperties"]["originAccountID"],
+        "OriginRegion": ss["sourceCloudProperties"]["originRegion"],
+    }
+
+    # The raw data lets modify_launch_templates skip fetching it again
+    # as long as the default template version has not moved
+    lc.pop("ResponseMetadata", None)
+    ss_raw = {
+        "SourceServerID": ss_id,
+        "TemplateID": lt_id,
+        "TemplateVersion": default_lt_version,
+        "LaunchConfiguration": json.dumps(lc, default=str),
+        "LaunchTemplateData": json.dumps(lt_data, default=str),
+    }
+
+    logActions(
+        "INF",
+        f"successfully parsed info for source server {ss_id} ({source_instance_name})",
+        None,
+    )
+    return ss_list_item, ss_info, ss_volumes, ss_security_rules, ss_raw
 
-            # Collect security group details
-            for sg in sg_ids:
-                sg_details = ec2_client.describe_security_groups(GroupIds=[sg_id])[
-                    "SecurityGroups"
-                ][0]
-                sg_name = next(
-                    (
-                        tag["Value"]
-                        for tag in sg_details.get("Tags", [])
-                        if tag["Key"] == "Name"
-                    ),
-                    "",
-                )
 
-                # Process inbound rules
-                for rule in sg_details["IpPermissions"]:
-                    from_port = rule.get("FromPort", "All")
-                    to_port = rule.get("ToPort", "All")
-                    protocol = rule.get("IpProtocol", "All")
-
-                    for ip_range in rule.get("IpRanges", []):
-                        rule_description = ip_range.get("Description", " ")
-                        security_rules.append(
-                            {
-                                "Hostname": source_instance_name,
-                                "OriginInstanceID": source_instance_id,
-                                "SecurityGroupName": sg_name,
-                                "SecurityGroupID": sg_id,
-                                "Direction": "Inbound",
-                                "Protocol": protocol,
-                                "FromPort": from_port,
-                                "ToPort": to_port,
-                                "CIDR": ip_range["CidrIp"],
-                                "RuleDescription": rule_description,
-                            }
-                        )
-
-                    for ip_range in rule.get("Ipv6Ranges", []):
-                        rule_description = ip_range.get("Description", " ")
-                        security_rules.append(
-                            {
-                                "Hostname": source_instance_name,
-                                "OriginInstanceID": source_instance_id,
-                                "SecurityGroupName": sg_name,
-                                "SecurityGroupID": sg_id,
-                                "Direction": "Inbound",
-                                "Protocol": protocol,
-                                "FromPort": from_port,
-                                "ToPort": to_port,
-                                "CIDR": ip_range["CidrIpv6"],
-                                "RuleDescription": rule_description,
-                            }
-                        )
-
-                    for prefix_list in rule.get("PrefixListIds", []):
-                        rule_description = prefix_list.get("Description", " ")
-                        security_rules.append(
-                            {
-                                "Hostname": source_instance_name,
-                                "OriginInstanceID": source_instance_id,
-                                "SecurityGroupName": sg_name,
-                                "SecurityGroupID": sg_id,
-                                "Direction": "Inbound",
-                                "Protocol": protocol,
-                                "FromPort": from_port,
-                                "ToPort": to_port,
-                                "CIDR": prefix_list["PrefixListId"],
-                                "RuleDescription": rule_description,
-                            }
-                        )
-
-                # Process outbound rules
-                for rule in sg_details["IpPermissionsEgress"]:
-                    from_port = rule.get("FromPort", "All")
-                    to_port = rule.get("ToPort", "All")
-                    protocol = rule.get("IpProtocol", "All")
-
-                    for ip_range in rule.get("IpRanges", []):
-                        rule_description = ip_range.get("Description", " ")
-                        security_rules.append(
-                            {
-                                "Hostname": source_instance_name,
-                                "OriginInstanceID": source_instance_id,
-                                "SecurityGroupName": sg_name,
-                                "SecurityGroupID": sg_id,
-                                "Direction": "Outbound",
-                                "Protocol": protocol,
-                                "FromPort": from_port,
-                                "ToPort": to_port,
-                                "CIDR": ip_range["CidrIp"],
-                                "RuleDescription": rule_description,
-                            }
-                        )
-
-                    for ip_range in rule.get("Ipv6Ranges", []):
-                        rule_description = ip_range.get("Description", " ")
-                        security_rules.append(
-                            {
-                                "Hostname": source_instance_name,
-                                "OriginInstanceID": source_instance_id,
-                                "SecurityGroupName": sg_name,
-                                "SecurityGroupID": sg_id,
-                                "Direction": "Outbound",
-                                "Protocol": protocol,
-                                "FromPort": from_port,
-                                "ToPort": to_port,
-                                "CIDR": ip_range["CidrIpv6"],
-                                "RuleDescription": rule_description,
-                            }
-                        )
-
-                    for prefix_list in rule.get("PrefixListIds", []):
-                        rule_description = prefix_list.get("Description", " ")
-                        security_rules.append(
-                            {
-                                "Hostname": source_instance_name,
-                                "OriginInstanceID": source_instance_id,
-                                "SecurityGroupName": sg_name,
-                                "SecurityGroupID": sg_id,
-                                "Direction": "Outbound",
-                                "Protocol": protocol,
-                                "FromPort": from_port,
-                                "ToPort": to_port,
-                                "CIDR": prefix_list["PrefixListId"],
-                                "RuleDescription": rule_description,
-                            }
-                        )
-
-            ss_list.append(
-                {
-                    "Hostname": source_instance_name,
-                    "SourceServerID": ss_id,
-                    "OriginInstanceID": source_instance_id,
-                    "OriginAccountID": ss["items"][0]["sourceCloudProperties"][
-                        "originAccountID"
-                    ],
-                    "OriginRegion": ss["items"][0]["sourceCloudProperties"][
-                        "originRegion"
-                    ],
+def parse_server(ss_id, ss_index, drs_client, ec2_client, normalize_sg_rules=False):
+    """Parses a single source server, isolating any failure to that server
+
+    :param ss_id: Source server ID
+    :type ss_id: string
+    :param ss_index: Source servers keyed by source server ID
+    :type ss_index: dict
+    :param drs_client: DRS boto client
+    :type drs_client: boto_client
+    :param ec2_client: EC2 boto client
+    :type ec2_client: boto_client
+    :param normalize_sg_rules: Return security group mappings instead of per-server rules
+    :type normalize_sg_rules: bool
+    :return: Output of get_server_details, None if parsing failed
+    :rtype: tuple
+    """
+
+    try:
+        ss = ss_index.get(ss_id)
+        if ss is None:
+            raise Exception(f"Source server {ss_id} was not found on DRS")
+        return get_server_details(
+            ss_id, ss, drs_client, ec2_client, normalize_sg_rules
+        )
+    except Exception as e:
+        logActions("ERR", f"Failed to parse info for source server {ss_id}", e)
+        return None
+
+
+def get_drs_details(df, drs_client, ec2_client, workers=1, normalize_sg_rules=False, region=None, journal=None):
+    """Returns all info related to DRS source servers
+
+    When normalize_sg_rules is set, security_rules maps each server to its
+    security groups and the rules are returned by get_normalized_sg_rules.
+    When region is set, every returned item gets a Region column. When a
+    journal is given, servers already in it are not parsed again and every
+    parsed server is recorded in it as soon as it completes.
+
+    :param df: Source server list
+    :type df: list
+    :param drs_client: DRS boto client
+    :type drs_client: boto_client
+    :param ec2_client: EC2 boto client
+    :type ec2_client: boto_client
+    :param workers: Number of source servers parsed concurrently
+    :type workers: int
+    :param normalize_sg_rules: Return security group mappings instead of per-server rules
+    :type normalize_sg_rules: bool
+    :param region: AWS Region of the clients
+    :type region: string
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: ss_list, ss_total_info, volumes, security_rules, raw_details
+    :rtype: list, list, list, list, list
+    """
+    
+    ss_list = []
+    ss_total_info = []
+    volumes = []
+    security_rules = []
+    raw_details = []
+    ss_ids = df["SourceServerID"].tolist()
+    journaled = journal.entries if journal is not None else {}
+    pending_ids = [ss_id for ss_id in ss_ids if ss_id not in journaled]
+    if journaled:
+        logActions(
+            "INF",
+            f"Resuming from the checkpoint journal: {len(ss_ids) - len(pending_ids)} source servers already parsed, {len(pending_ids)} left",
+            None,
+        )
+    ss_index = get_source_servers(pending_ids, drs_client)
+
+    def parse_and_record(ss_id):
+        # After Ctrl-C, the remaining servers are left for the resumed execution
+        if stop_requested.is_set():
+            return None
+        result = parse_server(ss_id, ss_index, drs_client, ec2_client, normalize_sg_rules)
+        if result is not None and journal is not None:
+            security_groups = None
+            if normalize_sg_rules:
+                # Needed to flatten the rules of these groups when resuming
+                security_groups = {
+                    mapping["SecurityGroupID"]: security_group_cache[mapping["SecurityGroupID"]]
+                    for mapping in result[3]
                 }
-            )
+            journal.append(ss_id, result, security_groups)
+        return result
+
+    # Executor.map yields results in submission order, so the output rows keep
+    # the order of the List sheet regardless of which server finishes first
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending_results = dict(zip(pending_ids, executor.map(parse_and_record, pending_ids)))
+
+        for ss_id in ss_ids:
+            if ss_id in journaled:
+                result = journaled[ss_id]["Result"]
+                security_group_cache.update(journaled[ss_id].get("SecurityGroups", {}))
+            else:
+                result = pending_results[ss_id]
+            if result is None:
+                continue
+            ss_list_item, ss_info, ss_volumes, ss_security_rules, ss_raw = result
+            ss_list.append(ss_list_item)
+            ss_total_info.append(ss_info)
+            volumes.extend(ss_volumes)
+            security_rules.extend(ss_security_rules)
+            raw_details.append(ss_raw)
+
+    if region is not None:
+        for items in [ss_list, ss_total_info, volumes, security_rules, raw_details]:
+            for item in items:
+                item["Region"] = region
+
+    log_api_call_counts()
+    log_resource_cache_stats()
+    return ss_list, ss_total_info, volumes, security_rules, raw_details
 
-            logActions(
-                "INF",
-                f"successfully parsed info for source server {ss_id} ({source_instance_name})",
-                None,
-            )
 
+def parse_region(region, df, workers=1, normalize_sg_rules=False, journal_path=None, resume=False):
+    """Returns all info related to the DRS source servers of a Region
+
+    :param region: AWS Region
+    :type region: string
+    :param df: Source server list of the Region
+    :type df: list
+    :param workers: Number of source servers parsed concurrently
+    :type workers: int
+    :param normalize_sg_rules: Return security group mappings instead of per-server rules
+    :type normalize_sg_rules: bool
+    :param journal_path: Path to the checkpoint journal of the Region, None to parse without one
+    :type journal_path: string
+    :param resume: Skip the source servers already in the checkpoint journal
+    :type resume: bool
+    :return: ss_list, ss_total_info, volumes, security_rules, raw_details, sg_rules (None unless normalize_sg_rules is set)
+    :rtype: list, list, list, list, list, list
+    """
+
+    # Also needed in the process of each Region, they all receive Ctrl-C
+    handle_interrupts()
+    journal = None
+    if journal_path is not None:
+        try:
+            journal = Journal(journal_path, {"NormalizeSgRules": normalize_sg_rules}, resume)
         except Exception as e:
-            logActions("ERR", f"Failed to parse info for source server {ss_id}", e)
+            logActions("ERR", f"Failed to open checkpoint journal ({journal_path})", e)
+            exit(1)
+
+    drs_client, ec2_client = init_aws_clients(region, workers)
+    ss_list, ss_total_info, volumes, security_rules, raw_details = get_drs_details(
+        df, drs_client, ec2_client, workers, normalize_sg_rules, region, journal
+    )
+    if journal is not None:
+        journal.close()
+    sg_rules = None
+    if normalize_sg_rules:
+        # Security groups are regional, so the rules come from this Region's cache
+        sg_rules = [
+            {**sg_rule, "Region": region}
+            for sg_rule in get_normalized_sg_rules(security_rules, security_group_cache)
+        ]
+    logActions("INF", f"{region}: {rate_controller.get_summary()}", None)
+    return ss_list, ss_total_info, volumes, security_rules, raw_details, sg_rules
+
+
+def parse_regions(list_df, regions, workers=1, normalize_sg_rules=False, journal_paths=None, resume=False):
+    """Parses the source servers of every Region, one process per Region, and merges the results
+
+    :param list_df: Source server list
+    :type list_df: list
+    :param regions: AWS Regions
+    :type regions: list
+    :param workers: Number of source servers parsed concurrently in each Region
+    :type workers: int
+    :param normalize_sg_rules: Return security group mappings instead of per-server rules
+    :type normalize_sg_rules: bool
+    :param journal_paths: Path to the checkpoint journal of each Region, None to parse without them
+    :type journal_paths: list
+    :param resume: Skip the source servers already in the checkpoint journals
+    :type resume: bool
+    :return: ss_list, ss_total_info, volumes, security_rules, raw_details, sg_rules (None unless normalize_sg_rules is set)
+    :rtype: list, list, list, list, list, list
+    """
 
-    return ss_list, ss_total_info, volumes, security_rules
+    if journal_paths is None:
+        journal_paths = [None] * len(regions)
+
+    if "Region" in list_df.columns:
+        region_dfs = [list_df[list_df["Region"] == region] for region in regions]
+        skipped = len(list_df) - sum(len(region_df) for region_df in region_dfs)
+        if skipped:
+            logActions("INF", f"Skipping {skipped} source servers of Regions not in {', '.join(regions)}, their rows are kept", None)
+    elif len(regions) == 1:
+        # Source server lists created before the Region column belong to a single Region
+        region_dfs = [list_df]
+    else:
+        logActions("ERR", "The List sheet has no Region column. Run init_xls.py with the same Regions first", None)
+        exit(1)
+
+    if len(regions) == 1:
+        results = [
+            parse_region(regions[0], region_dfs[0], workers, normalize_sg_rules, journal_paths[0], resume)
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=len(regions)) as executor:
+            results = list(
+                executor.map(
+                    parse_region,
+                    regions,
+                    region_dfs,
+                    [workers] * len(regions),
+                    [normalize_sg_rules] * len(regions),
+                    journal_paths,
+                    [resume] * len(regions),
+                )
+            )
+
+    # Rows keep the order of the Regions, then the order of the List sheet
+    merged = [[item for result in results for item in result[i]] for i in range(5)]
+    sg_rules = None
+    if normalize_sg_rules:
+        sg_rules = [sg_rule for result in results for sg_rule in result[5]]
+    return (*merged, sg_rules)
 
 
 def update_workbook(
-    source_server_list, drs_details, drs_vol_details, drs_sg_details, file_path, additional_exec
+    source_server_list, drs_details, drs_vol_details, drs_sg_details, file_path, additional_exec, drs_sg_rules=None, drs_raw_details=None, regions=None
 ):
     """Updates the XLS doc with DRS related info
 
@@ -330,12 +615,20 @@ def update_workbook(
     :type drs_details: list
     :param drs_vol_details: Volume data
     :type drs_vol_details: list
-    :param drs_sg_details: Security Group data
+    :param drs_sg_details: Security Group data (server to group mapping if drs_sg_rules is set)
     :type drs_sg_details: list
     :param file_path: Path to the XLS doc
     :type file_path: string
     :param additional_exec: If it is the initial DRS parsing step
     :type additional_exec: bool
+    :param drs_sg_rules: Normalized Security Group rules, None for the per-server rules view
+    :type drs_sg_rules: list
+    :param drs_raw_details: Raw launch configuration and launch template data
+    :type drs_raw_details: list
+    :param regions: Parsed Regions, only their rows are replaced on sheets with a Region column. None replaces the whole sheets
+    :type regions: list
+    :return: True if the XLS doc was updated
+    :rtype: bool
     """
     
     try:
@@ -345,52 +638,114 @@ def update_workbook(
         volumes_df = pd.DataFrame(drs_vol_details)
         rules_df = pd.DataFrame(drs_sg_details)
 
-        # Save all DataFrames to Excel
-        with pd.ExcelWriter(
-            file_path, engine="openpyxl", mode="a", if_sheet_exists="replace"
-        ) as writer:
-            ss_list_df.to_excel(writer, sheet_name="List", index=False)
-            ss_df.to_excel(writer, sheet_name="DRS_Details", index=False)
-            volumes_df.to_excel(writer, sheet_name="DRS_Vol_Details", index=False)
-            rules_df.to_excel(writer, sheet_name="DRS_SG_Details", index=False)
-            
-            if not additional_exec:
-                ss_df.to_excel(writer, sheet_name="Initial_DRS_Details", index=False)
-                volumes_df.to_excel(writer, sheet_name="Initial_DRS_Vol_Details", index=False)
-
-        logActions("INF", f"Successfully updated XLS document ({file_path})", None)
+        sheets = {
+            "List": ss_list_df,
+            "DRS_Details": ss_df,
+            "DRS_Vol_Details": volumes_df,
+        }
+        remove_sheets = []
+        if drs_sg_rules is None:
+            sheets["DRS_SG_Details"] = rules_df
+        else:
+            sheets["DRS_Instance_SGs"] = rules_df
+            sheets["DRS_SG_Rules"] = pd.DataFrame(drs_sg_rules)
+            # Drop the per-server view of a previous run, it would be stale
+            remove_sheets.append("DRS_SG_Details")
+
+        if not additional_exec:
+            sheets["Initial_DRS_Details"] = ss_df
+            sheets["Initial_DRS_Vol_Details"] = volumes_df
+
+        if drs_raw_details is not None:
+            sheets["DRS_Raw_Details"] = pd.DataFrame(drs_raw_details)
+
+        if regions is not None:
+            # Rows of the Regions that were not parsed are kept as they are
+            current = load_sheets(
+                file_path,
+                {sheet_name: None for sheet_name in sheets},
+                optional_sheets=list(sheets),
+                preserve_types=True,
+            )
+            for sheet_name, df in sheets.items():
+                current_df = current[sheet_name]
+                if "Region" in current_df.columns and (df.empty or "Region" in df.columns):
+                    patched = patch_rows(current_df, df, "Region", regions)
+                    # Columns follow the parsed data, as on a full update
+                    sheets[sheet_name] = patched if df.empty else patched.reindex(columns=df.columns)
+
+        # Only the sheets whose content changed are rewritten
+        modified = write_sheets(file_path, sheets, remove_sheets)
+
+        if modified:
+            logActions("INF", f"Successfully updated XLS document ({file_path}), modified sheets: {', '.join(modified)}", None)
+        else:
+            logActions("INF", f"XLS document is up to date, nothing to write ({file_path})", None)
+        return True
     except Exception as e:
         logActions("ERR", f"Failed to update XLS document ({file_path})", e)
+        return False
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "--region", type=str, required=True, help="Name of the DR Region"
+        "--region", type=str, nargs="+", required=True, help="Name of the DR Region. Several Regions are parsed concurrently"
     )
     parser.add_argument(
-        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+        "--workbook-path", type=str, required=False, help="Path to the XLSX file, or to a SQLite state file (.db)"
     )
     parser.add_argument(
         "--additional-exec", action="store_true", help="Flags the initial execution in order to create the respective sheets"
     )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of source servers to parse concurrently"
+    )
+    parser.add_argument(
+        "--normalize-sg-rules", action="store_true", help="Write each security group's rules once (DRS_SG_Rules) along with a server to security group mapping (DRS_Instance_SGs), instead of the per-server DRS_SG_Details sheet"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Continue an interrupted execution, skipping the source servers already in its checkpoint journal"
+    )
     # Parse the arguments
     args = parser.parse_args()
-    region = args.region
+    regions = list(dict.fromkeys(args.region))
     file_path = args.workbook_path
     additional_exec = args.additional_exec
+    workers = args.workers
+    normalize_sg_rules = args.normalize_sg_rules
 
     # Not providing '--workbook-path' option defaults in './DRS_Templates.xlsx'
     if file_path == None:
         file_path = "DRS_Templates.xlsx"
 
-    drs_client, ec2_client = init_aws_clients(region)
+    if workers < 1:
+        logActions("ERR", "Invalid number of workers. It must be at least 1", None)
+        exit(1)
+
+    # Ctrl-C lets the servers in progress finish and keeps the checkpoint journals
+    handle_interrupts()
+    journal_paths = [get_journal_path(file_path, f"drs-{region}") for region in regions]
     list_df = read_excel(file_path)
-    source_server_list, drs_details, drs_vol_details, drs_sg_details = get_drs_details(
-        list_df, drs_client, ec2_client
-    )
-    update_workbook(
-        source_server_list, drs_details, drs_vol_details, drs_sg_details, file_path, additional_exec
+    source_server_list, drs_details, drs_vol_details, drs_sg_details, drs_raw_details, drs_sg_rules = parse_regions(
+        list_df, regions, workers, normalize_sg_rules, journal_paths, args.resume
     )
+    if stop_requested.is_set():
+        logActions("INF", "Execution interrupted, the parsed source servers are kept in the checkpoint journal. Execute again with '--resume' to continue", None)
+        exit(130)
+    # XLS docs listing several Regions only get the rows of the parsed Regions replaced
+    if update_workbook(
+        source_server_list,
+        drs_details,
+        drs_vol_details,
+        drs_sg_details,
+        file_path,
+        additional_exec,
+        drs_sg_rules,
+        drs_raw_details,
+        regions if "Region" in list_df.columns else None,
+    ):
+        for journal_path in journal_paths:
+            remove_journal(journal_path)
     logActions("INF", f"Execution finished", None)
@@ -1,39 +1,39 @@
 import pandas as pd
-import boto3
 import argparse
-import datetime
+import asyncio
+from botocore.exceptions import ClientError, ParamValidationError
+from concurrent.futures import ThreadPoolExecutor
+from aws_utils import get_client, get_normalized_sg_rules, get_role_session, get_sg_rules, rate_controller
+from checkpoint_utils import Journal, get_journal_path, handle_interrupts, remove_journal, stop_requested
+from log_utils import logActions
+from workbook_utils import load_sheets, normalize_value, write_sheets
 
+# Number of instance IDs described per describe_instances call, also used
+# as the attachment.instance-id filter of describe_volumes (max 200 values)
+INSTANCE_ID_BATCH_SIZE = 200
 
-def logActions(level, short_desc, long_desc):
-    """Formats and prints logs
+# Error codes that fail a whole describe_instances batch because of a single ID
+INVALID_INSTANCE_ID_ERRORS = ["InvalidInstanceID.NotFound", "InvalidInstanceID.Malformed"]
 
-    :param level: Log level (INF,ERR)
-    :type level: string
-    :param short_desc: Short log message
-    :type short_desc: string
-    :param long_desc: Long log message
-    :type long_desc: string
-    """
-
-    dt_object = datetime.datetime.now()
-    dt_string = dt_object.strftime("%m/%d/%Y %H:%M:%S")
-    prefix = f"{dt_string} - {level}:"
-    print(f"{prefix} {short_desc}")
-    if long_desc:
-        print(f"{prefix} {long_desc}")
+# Region-wide reference data keyed by resource ID, populated by prefetch_reference_data
+vpc_index = {}
+subnet_index = {}
+security_group_index = {}
 
 
-def init_aws_clients(region):
+def init_aws_clients(region, concurrency=1):
     """Initializes EC2 boto client
 
     :param region: AWS Region
     :type region: string
+    :param concurrency: Number of threads sharing the client
+    :type concurrency: int
     :return: EC2 client
     :rtype: boto_client
     """
 
     try:
-        ec2_client = boto3.client("ec2", region_name=region)
+        ec2_client = get_client("ec2", region, concurrency)
 
         logActions("INF", "Successfully created AWS clients", None)
         return ec2_client
@@ -52,7 +52,9 @@ def read_excel(file_path):
     """
 
     try:
-        df = pd.read_excel(file_path, sheet_name="List")
+        df = load_sheets(
+            file_path, {"List": ["OriginInstanceID", "OriginAccountID", "OriginRegion", "Region"]}
+        )["List"]
         logActions("INF", f"Successfully parsed XLS document ({file_path})", None)
         return df
     except Exception as e:
@@ -60,6 +62,94 @@ def read_excel(file_path):
         exit(1)
 
 
+def prefetch_reference_data(ec2_client):
+    """Loads all VPCs, subnets and security groups of the region into the lookup indexes
+
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    """
+
+    try:
+        for page in ec2_client.get_paginator("describe_vpcs").paginate():
+            for vpc in page["Vpcs"]:
+                vpc_index[vpc["VpcId"]] = vpc
+        for page in ec2_client.get_paginator("describe_subnets").paginate():
+            for subnet in page["Subnets"]:
+                subnet_index[subnet["SubnetId"]] = subnet
+        for page in ec2_client.get_paginator("describe_security_groups").paginate():
+            for sg in page["SecurityGroups"]:
+                security_group_index[sg["GroupId"]] = sg
+
+        logActions(
+            "INF",
+            f"Prefetched {len(vpc_index)} VPCs, {len(subnet_index)} subnets and {len(security_group_index)} security groups",
+            None,
+        )
+    except Exception as e:
+        # Lookups fall back to per-resource calls for anything not prefetched
+        logActions("ERR", "Failed to prefetch VPC, subnet and security group data", e)
+
+
+def describe_vpc(vpc_id, ec2_client):
+    """Describes a VPC into the lookup index
+
+    :param vpc_id: VPC ID
+    :type vpc_id: string
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    :return: VPC
+    :rtype: dict
+    """
+
+    vpc = ec2_client.describe_vpcs(VpcIds=[vpc_id])["Vpcs"][0]
+    vpc_index[vpc_id] = vpc
+    return vpc
+
+
+def describe_subnet(subnet_id, ec2_client):
+    """Describes a subnet into the lookup index
+
+    :param subnet_id: Subnet ID
+    :type subnet_id: string
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    :return: Subnet
+    :rtype: dict
+    """
+
+    subnet = ec2_client.describe_subnets(SubnetIds=[subnet_id])["Subnets"][0]
+    subnet_index[subnet_id] = subnet
+    return subnet
+
+
+def describe_security_groups(sg_ids, ec2_client):
+    """Describes security groups into the lookup index
+
+    :param sg_ids: Security group IDs
+    :type sg_ids: list
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    """
+
+    for sg in ec2_client.describe_security_groups(GroupIds=sg_ids)["SecurityGroups"]:
+        security_group_index[sg["GroupId"]] = sg
+
+
+def describe_volumes(volume_ids, volume_index, ec2_client):
+    """Describes volumes into the volume index of a batch
+
+    :param volume_ids: Volume IDs
+    :type volume_ids: list
+    :param volume_index: Volumes keyed by volume ID
+    :type volume_index: dict
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    """
+
+    for volume in ec2_client.describe_volumes(VolumeIds=volume_ids)["Volumes"]:
+        volume_index[volume["VolumeId"]] = volume
+
+
 def get_vpc_name(vpc_id, ec2_client):
     """Returns VPC Name
 
@@ -72,8 +162,10 @@ def get_vpc_name(vpc_id, ec2_client):
     """
 
     try:
-        response = ec2_client.describe_vpcs(VpcIds=[vpc_id])
-        tags = response["Vpcs"][0].get("Tags", [])
+        vpc = vpc_index.get(vpc_id)
+        if vpc is None:
+            vpc = describe_vpc(vpc_id, ec2_client)
+        tags = vpc.get("Tags", [])
         return next((tag["Value"] for tag in tags if tag["Key"] == "Name"), vpc_id)
     except Exception as e:
         logActions("ERR", f"Failed to get VPC name ({vpc_id})", e)
@@ -91,26 +183,94 @@ def get_subnet_name(subnet_id, ec2_client):
     """
 
     try:
-        response = ec2_client.describe_subnets(SubnetIds=[subnet_id])
-        tags = response["Subnets"][0].get("Tags", [])
+        subnet = subnet_index.get(subnet_id)
+        if subnet is None:
+            subnet = describe_subnet(subnet_id, ec2_client)
+        tags = subnet.get("Tags", [])
         return next((tag["Value"] for tag in tags if tag["Key"] == "Name"), subnet_id)
     except Exception as e:
         logActions("ERR", f"Failed to get Subnet name ({subnet_id})", e)
 
 
-def get_instance_info(instance_id, ec2_client):
+def get_instances(instance_ids, ec2_client):
+    """Describes a batch of instances, splitting the batch to isolate IDs that do not exist
+
+    :param instance_ids: Instance IDs
+    :type instance_ids: list
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    :return: Instances keyed by instance ID, without the IDs that were not found
+    :rtype: dict
+    """
+
+    try:
+        instances = {}
+        paginator = ec2_client.get_paginator("describe_instances")
+        for page in paginator.paginate(InstanceIds=instance_ids):
+            for reservation in page["Reservations"]:
+                for instance in reservation["Instances"]:
+                    instances[instance["InstanceId"]] = instance
+        return instances
+    except (ClientError, ParamValidationError) as e:
+        # Parameter validation fails the batch before any call, e.g. for IDs that are not strings
+        if isinstance(e, ClientError) and e.response["Error"]["Code"] not in INVALID_INSTANCE_ID_ERRORS:
+            raise
+        if len(instance_ids) == 1:
+            return {}
+        middle = len(instance_ids) // 2
+        instances = get_instances(instance_ids[:middle], ec2_client)
+        instances.update(get_instances(instance_ids[middle:], ec2_client))
+        return instances
+
+
+def get_volumes(instance_ids, ec2_client):
+    """Returns all volumes attached to a batch of instances
+
+    :param instance_ids: Instance IDs
+    :type instance_ids: list
+    :param ec2_client: EC2 Boto client
+    :type ec2_client: boto_client
+    :return: Volumes keyed by volume ID
+    :rtype: dict
+    """
+
+    try:
+        volume_index = {}
+        paginator = ec2_client.get_paginator("describe_volumes")
+        for page in paginator.paginate(
+            Filters=[{"Name": "attachment.instance-id", "Values": instance_ids}]
+        ):
+            for volume in page["Volumes"]:
+                volume_index[volume["VolumeId"]] = volume
+        return volume_index
+    except Exception as e:
+        # Volumes of the batch fall back to per-volume calls
+        logActions(
+            "ERR",
+            f"Failed to describe volumes of instances {instance_ids[0]} to {instance_ids[-1]}",
+            e,
+        )
+        return {}
+
+
+def get_instance_info(instance, ec2_client, volume_index=None, normalize_sg_rules=False):
     """Returns all info related to an EC2 instance
 
-    :param instance_id: Instance ID
-    :type instance_id: string
+    :param instance: Instance as returned by describe_instances
+    :type instance: dict
     :param ec2_client: EC2 Boto client
     :type ec2_client: boto_client
+    :param volume_index: Prefetched volumes keyed by volume ID
+    :type volume_index: dict
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
     :return: instance_info, security_rules, volumes, instance_tags
     :rtype: list, list, list, list
     """
 
-    response = ec2_client.describe_instances(InstanceIds=[instance_id])
-    instance = response["Reservations"][0]["Instances"][0]
+    instance_id = instance["InstanceId"]
+    if volume_index is None:
+        volume_index = {}
 
     # Extract basic instance details
     instance_type = instance["InstanceType"]
@@ -149,7 +309,9 @@ def get_instance_info(instance_id, ec2_client):
     volumes = []
     for vol in instance["BlockDeviceMappings"]:
         vol_id = vol["Ebs"]["VolumeId"]
-        vol_details = ec2_client.describe_volumes(VolumeIds=[vol_id])["Volumes"][0]
+        vol_details = volume_index.get(vol_id)
+        if vol_details is None:
+            vol_details = ec2_client.describe_volumes(VolumeIds=[vol_id])["Volumes"][0]
         attachments = vol_details["Attachments"]
         for attachment in attachments:
             if attachment["InstanceId"] == instance_id:
@@ -184,9 +346,13 @@ def get_instance_info(instance_id, ec2_client):
         sg_id = sg["GroupId"]
         sg_ids.append(sg_id)
 
-        sg_details = ec2_client.describe_security_groups(GroupIds=[sg_id])[
-            "SecurityGroups"
-        ][0]
+        sg_details = security_group_index.get(sg_id)
+        if sg_details is None:
+            sg_details = ec2_client.describe_security_groups(GroupIds=[sg_id])[
+                "SecurityGroups"
+            ][0]
+            # Keep it for the next instances and for the normalized rules sheet
+            security_group_index[sg_id] = sg_details
         sg_name = next(
             (
                 tag["Value"]
@@ -197,119 +363,26 @@ def get_instance_info(instance_id, ec2_client):
         )
         sg_names.append(sg_name)
 
-        # Process inbound rules
-        for rule in sg_details["IpPermissions"]:
-            from_port = rule.get("FromPort", "All")
-            to_port = rule.get("ToPort", "All")
-            protocol = rule.get("IpProtocol", "All")
-
-            for ip_range in rule.get("IpRanges", []):
-                rule_description = ip_range.get("Description", " ")
-                security_rules.append(
-                    {
-                        "InstanceName": instance_name,
-                        "InstanceID": instance_id,
-                        "SecurityGroupName": sg_name,
-                        "SecurityGroupID": sg_id,
-                        "Direction": "Inbound",
-                        "Protocol": protocol,
-                        "FromPort": from_port,
-                        "ToPort": to_port,
-                        "CIDR": ip_range["CidrIp"],
-                        "RuleDescription": rule_description,
-                    }
-                )
-
-            for ip_range in rule.get("Ipv6Ranges", []):
-                rule_description = ip_range.get("Description", " ")
-                security_rules.append(
-                    {
-                        "InstanceName": instance_name,
-                        "InstanceID": instance_id,
-                        "SecurityGroupName": sg_name,
-                        "SecurityGroupID": sg_id,
-                        "Direction": "Inbound",
-                        "Protocol": protocol,
-                        "FromPort": from_port,
-                        "ToPort": to_port,
-                        "CIDR": ip_range["CidrIpv6"],
-                        "RuleDescription": rule_description,
-                    }
-                )
-
-            for prefix_list in rule.get("PrefixListIds", []):
-                rule_description = prefix_list.get("Description", " ")
-                security_rules.append(
-                    {
-                        "InstanceName": instance_name,
-                        "InstanceID": instance_id,
-                        "SecurityGroupName": sg_name,
-                        "SecurityGroupID": sg_id,
-                        "Direction": "Inbound",
-                        "Protocol": protocol,
-                        "FromPort": from_port,
-                        "ToPort": to_port,
-                        "CIDR": prefix_list["PrefixListId"],
-                        "RuleDescription": rule_description,
-                    }
-                )
-
-        # Process outbound rules
-        for rule in sg_details["IpPermissionsEgress"]:
-            from_port = rule.get("FromPort", "All")
-            to_port = rule.get("ToPort", "All")
-            protocol = rule.get("IpProtocol", "All")
-
-            for ip_range in rule.get("IpRanges", []):
-                rule_description = ip_range.get("Description", " ")
-                security_rules.append(
-                    {
-                        "InstanceName": instance_name,
-                        "InstanceID": instance_id,
-                        "SecurityGroupName": sg_name,
-                        "SecurityGroupID": sg_id,
-                        "Direction": "Outbound",
-                        "Protocol": protocol,
-                        "FromPort": from_port,
-                        "ToPort": to_port,
-                        "CIDR": ip_range["CidrIp"],
-                        "RuleDescription": rule_description,
-                    }
-                )
-
-            for ip_range in rule.get("Ipv6Ranges", []):
-                rule_description = ip_range.get("Description", " ")
+        if normalize_sg_rules:
+            # Rules are flattened once per group into the SG rules sheet
+            security_rules.append(
+                {
+                    "InstanceName": instance_name,
+                    "InstanceID": instance_id,
+                    "SecurityGroupName": sg_name,
+                    "SecurityGroupID": sg_id,
+                }
+            )
+        else:
+            for sg_rule in get_sg_rules(sg_id, sg_details):
                 security_rules.append(
                     {
                         "InstanceName": instance_name,
                         "InstanceID": instance_id,
-                        "SecurityGroupName": sg_name,
-                        "SecurityGroupID": sg_id,
-                        "Direction": "Outbound",
-                        "Protocol": protocol,
-                        "FromPort": from_port,
-                        "ToPort": to_port,
-                        "CIDR": ip_range["CidrIpv6"],
-                        "RuleDescription": rule_description,
+                        **sg_rule,
                     }
                 )
 
-            for prefix_list in rule.get("PrefixListIds", []):
-                rule_description = prefix_list.get("Description", " ")
-                security_rules.append(
-                    {
-                        "InstanceName": instance_name,
-                        "InstanceID": instance_id,
-                        "SecurityGroupName": sg_name,
-                        "SecurityGroupID": sg_id,
-                        "Direction": "Outbound",
-                        "Protocol": protocol,
-                        "FromPort": from_port,
-                        "ToPort": to_port,
-                        "CIDR": prefix_list["PrefixListId"],
-                        "RuleDescription": rule_description,
-                    }
-                )
     instance_info = {
         "InstanceName": instance_name,
         "InstanceID": instance_id,
@@ -331,45 +404,490 @@ def get_instance_info(instance_id, ec2_client):
     return instance_info, security_rules, volumes, instance_tags
 
 
-def get_ec2_details(list_df, ec2_client):
-    """Returns the complete detail lists
+def get_instance_batch(batch, ec2_client):
+    """Describes a batch of instances along with their volumes
 
-    :param list_df: Instance List
-    :type list_df: pd dataframe
+    :param batch: Instance IDs
+    :type batch: list
     :param ec2_client: Boto EC2 client
     :type ec2_client: boto_client
+    :return: instances, volume_index (both keyed by ID), None if the batch could not be described
+    :rtype: dict, dict
+    """
+
+    # After Ctrl-C, the remaining instances are left for the resumed execution
+    if stop_requested.is_set():
+        return None
+    # Blank List cells would fail the whole batch, they are reported as not found by parse_instance
+    instance_ids = [
+        instance_id
+        for instance_id in dict.fromkeys(batch)
+        if isinstance(instance_id, str) and instance_id.strip()
+    ]
+    try:
+        instances = get_instances(instance_ids, ec2_client) if instance_ids else {}
+        volume_index = get_volumes(list(instances), ec2_client) if instances else {}
+        return instances, volume_index
+    except Exception as e:
+        logActions(
+            "ERR",
+            f"Failed to describe instances {batch[0]} to {batch[-1]}",
+            e,
+        )
+        return None
+
+
+def parse_instance(instance_id, instances, volume_index, ec2_client, normalize_sg_rules=False, journal=None):
+    """Parses a single instance, isolating any failure to that instance, and records it in the checkpoint journal
+
+    :param instance_id: Instance ID
+    :type instance_id: string
+    :param instances: Described instances keyed by instance ID
+    :type instances: dict
+    :param volume_index: Described volumes keyed by volume ID
+    :type volume_index: dict
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: Output of get_instance_info, None if parsing failed
+    :rtype: tuple
+    """
+
+    if stop_requested.is_set():
+        return None
+    try:
+        instance = instances.get(instance_id)
+        if instance is None:
+            raise Exception(f"Instance {instance_id} was not found")
+        result = get_instance_info(
+            instance, ec2_client, volume_index, normalize_sg_rules
+        )
+        if journal is not None:
+            security_groups = None
+            if normalize_sg_rules:
+                # Needed to flatten the rules of these groups when resuming
+                security_groups = {
+                    mapping["SecurityGroupID"]: security_group_index[mapping["SecurityGroupID"]]
+                    for mapping in result[1]
+                }
+            journal.append(instance_id, result, security_groups)
+        return result
+    except Exception as e:
+        logActions("ERR", f"Failed to parse info for instance {instance_id}", e)
+        return None
+
+
+def merge_instance_results(results):
+    """Merges the per-instance results into the complete detail lists
+
+    :param results: Outputs of parse_instance
+    :type results: list
     :return: instance_data, security_rules_data, volume_data, instance_tags_data
     :rtype: list, list, list, list
     """
-    
+
     instance_data = []
     security_rules_data = []
     volume_data = []
     instance_tags_data = []
 
-    for instance_id in list_df["OriginInstanceID"]:
-        try:
-            instance_info, security_rules, volumes, instance_tags = get_instance_info(
-                instance_id, ec2_client
-            )
-            instance_data.append(instance_info)
-            security_rules_data.extend(security_rules)
-            volume_data.extend(volumes)
-            instance_tags_data.extend(instance_tags)
-        except Exception as e:
-            logActions("ERR", f"Failed to parse info for instance {instance_id}", e)
+    for result in results:
+        if result is None:
+            continue
+        instance_info, security_rules, volumes, instance_tags = result
+        instance_data.append(instance_info)
+        security_rules_data.extend(security_rules)
+        volume_data.extend(volumes)
+        instance_tags_data.extend(instance_tags)
 
     return instance_data, security_rules_data, volume_data, instance_tags_data
 
 
+def get_ec2_details(list_df, ec2_client, normalize_sg_rules=False, journal=None):
+    """Returns the complete detail lists
+
+    When normalize_sg_rules is set, security_rules_data maps each instance to
+    its security groups and the rules are returned by get_normalized_sg_rules.
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: instance_data, security_rules_data, volume_data, instance_tags_data
+    :rtype: list, list, list, list
+    """
+    
+    results = []
+    instance_ids = list_df["OriginInstanceID"].tolist()
+
+    for i in range(0, len(instance_ids), INSTANCE_ID_BATCH_SIZE):
+        batch = instance_ids[i : i + INSTANCE_ID_BATCH_SIZE]
+        batch_data = get_instance_batch(batch, ec2_client)
+        if batch_data is None:
+            continue
+        instances, volume_index = batch_data
+
+        for instance_id in batch:
+            results.append(
+                parse_instance(
+                    instance_id, instances, volume_index, ec2_client, normalize_sg_rules, journal
+                )
+            )
+
+    return merge_instance_results(results)
+
+
+async def parse_instance_async(instance_id, instances, volume_index, ec2_client, run, lookup, normalize_sg_rules=False, journal=None):
+    """Parses a single instance as a chain of awaited steps
+
+    The VPC, subnet, volumes and security groups the described instance refers
+    to are looked up concurrently, each lookup being a single request, then
+    parse_instance assembles the result from the lookup indexes.
+
+    :param instance_id: Instance ID
+    :type instance_id: string
+    :param instances: Described instances keyed by instance ID
+    :type instances: dict
+    :param volume_index: Described volumes keyed by volume ID
+    :type volume_index: dict
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param run: Runs a blocking call on the shared executor
+    :type run: coroutine function
+    :param lookup: Runs a lookup once per resource, later callers await the same lookup
+    :type lookup: function
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: Output of get_instance_info, None if parsing failed
+    :rtype: tuple
+    """
+
+    instance = instances.get(instance_id)
+    if instance is not None and not stop_requested.is_set():
+        steps = []
+        if instance.get("VpcId") and instance["VpcId"] not in vpc_index:
+            steps.append(lookup(instance["VpcId"], describe_vpc, instance["VpcId"], ec2_client))
+        if instance.get("SubnetId") and instance["SubnetId"] not in subnet_index:
+            steps.append(lookup(instance["SubnetId"], describe_subnet, instance["SubnetId"], ec2_client))
+        volume_ids = [
+            vol["Ebs"]["VolumeId"]
+            for vol in instance.get("BlockDeviceMappings", [])
+            if "Ebs" in vol and vol["Ebs"]["VolumeId"] not in volume_index
+        ]
+        if volume_ids:
+            steps.append(run(describe_volumes, volume_ids, volume_index, ec2_client))
+        sg_ids = [
+            sg["GroupId"]
+            for sg in instance.get("SecurityGroups", [])
+            if sg["GroupId"] not in security_group_index
+        ]
+        for sg_id in sg_ids:
+            steps.append(lookup(sg_id, describe_security_groups, [sg_id], ec2_client))
+        # A failed lookup is retried and reported by parse_instance
+        await asyncio.gather(*steps, return_exceptions=True)
+    return await run(
+        parse_instance, instance_id, instances, volume_index, ec2_client, normalize_sg_rules, journal
+    )
+
+
+async def get_ec2_details_async(list_df, ec2_client, executor, normalize_sg_rules=False, journal=None):
+    """Returns the complete detail lists, parsing the instances concurrently
+
+    Each batch is described, then every instance of the batch is parsed by
+    parse_instance_async. Blocking boto calls run on the given executor, whose
+    size caps the number of requests in flight. The executor can be shared by
+    the collections of several accounts, the cap then applies to all of them.
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :param ec2_client: Boto EC2 client
+    :type ec2_client: boto_client
+    :param executor: Executor running the blocking boto calls
+    :type executor: ThreadPoolExecutor
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: instance_data, security_rules_data, volume_data, instance_tags_data
+    :rtype: list, list, list, list
+    """
+
+    loop = asyncio.get_running_loop()
+    instance_ids = list_df["OriginInstanceID"].tolist()
+    # Lookups in progress by resource ID, instances sharing a resource await the same request
+    lookups = {}
+
+    async def run(func, *args):
+        return await loop.run_in_executor(executor, func, *args)
+
+    def lookup(resource_id, func, *args):
+        if resource_id not in lookups:
+            lookups[resource_id] = asyncio.ensure_future(run(func, *args))
+        return lookups[resource_id]
+
+    async def collect_batch(batch):
+        batch_data = await run(get_instance_batch, batch, ec2_client)
+        if batch_data is None:
+            return []
+        instances, volume_index = batch_data
+        return await asyncio.gather(
+            *(
+                parse_instance_async(
+                    instance_id,
+                    instances,
+                    volume_index,
+                    ec2_client,
+                    run,
+                    lookup,
+                    normalize_sg_rules,
+                    journal,
+                )
+                for instance_id in batch
+            )
+        )
+
+    # gather returns results in submission order, keeping the List sheet order
+    batch_results = await asyncio.gather(
+        *(
+            collect_batch(instance_ids[i : i + INSTANCE_ID_BATCH_SIZE])
+            for i in range(0, len(instance_ids), INSTANCE_ID_BATCH_SIZE)
+        )
+    )
+
+    return merge_instance_results(
+        [result for results in batch_results for result in results]
+    )
+
+
+def get_account_groups(list_df):
+    """Groups the instance list by origin account and Region
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :return: (account, region, instance list) of every group, in the order the groups first appear
+    :rtype: list
+    """
+
+    def get_key(value, width=0):
+        value = normalize_value(value)
+        if value is None or not str(value).strip():
+            return None
+        return str(value).strip().zfill(width)
+
+    # Account IDs read back as numbers lose their leading zeros
+    keys = pd.DataFrame(
+        {
+            "Account": [get_key(account, 12) for account in list_df["OriginAccountID"]],
+            "Region": [get_key(region) for region in list_df["OriginRegion"]],
+        },
+        index=list_df.index,
+    )
+    missing = keys.isna().any(axis=1)
+    if missing.any():
+        logActions(
+            "ERR",
+            f"Skipping {missing.sum()} instances without an origin account or Region on the List sheet",
+            ", ".join(str(instance_id) for instance_id in list_df["OriginInstanceID"][missing]),
+        )
+
+    groups = list_df[~missing].groupby(
+        [keys["Account"][~missing], keys["Region"][~missing]], sort=False
+    )
+    return [(account, region, group_df) for (account, region), group_df in groups]
+
+
+def get_account_ec2_details(account, region, list_df, role_name, concurrency=1, executor=None, prefetch=False, normalize_sg_rules=False, journal=None):
+    """Returns the complete detail lists of the instances of an account and Region, assuming a role in the account
+
+    :param account: AWS account ID
+    :type account: string
+    :param region: AWS Region
+    :type region: string
+    :param list_df: Instance List of the account and Region
+    :type list_df: pd dataframe
+    :param role_name: Name of the IAM role to assume in the account
+    :type role_name: string
+    :param concurrency: Number of threads sharing the EC2 client
+    :type concurrency: int
+    :param executor: Executor shared by all accounts, the instances are parsed concurrently with asyncio when set
+    :type executor: ThreadPoolExecutor
+    :param prefetch: Load all VPCs, subnets and security groups of the account and Region upfront
+    :type prefetch: bool
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: instance_data, security_rules_data, volume_data, instance_tags_data
+    :rtype: list, list, list, list
+    """
+
+    try:
+        session = get_role_session(account, role_name)
+        ec2_client = get_client("ec2", region, concurrency, account, session)
+    except Exception as e:
+        logActions("ERR", f"Failed to assume role {role_name} in account {account}, skipping its {len(list_df)} instances", e)
+        return [], [], [], []
+
+    logActions("INF", f"Parsing {len(list_df)} instances of account {account} ({region})", None)
+    if executor is not None:
+        # The requests of every account go through the shared executor, keeping them under its cap
+        if prefetch:
+            executor.submit(prefetch_reference_data, ec2_client).result()
+        return asyncio.run(
+            get_ec2_details_async(list_df, ec2_client, executor, normalize_sg_rules, journal)
+        )
+    if prefetch:
+        prefetch_reference_data(ec2_client)
+    return get_ec2_details(list_df, ec2_client, normalize_sg_rules, journal)
+
+
+def get_all_accounts_ec2_details(list_df, role_name, account_concurrency=1, concurrency=1, async_mode=False, prefetch=False, normalize_sg_rules=False, journal=None):
+    """Returns the complete detail lists, collecting each origin account and Region concurrently
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :param role_name: Name of the IAM role to assume in every account
+    :type role_name: string
+    :param account_concurrency: Number of accounts and Regions collected concurrently
+    :type account_concurrency: int
+    :param concurrency: Maximum number of requests in flight across all accounts when async_mode is set
+    :type concurrency: int
+    :param async_mode: Parse the instances of each account concurrently with asyncio
+    :type async_mode: bool
+    :param prefetch: Load all VPCs, subnets and security groups of each account and Region upfront
+    :type prefetch: bool
+    :param normalize_sg_rules: Return security group mappings instead of per-instance rules
+    :type normalize_sg_rules: bool
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :return: instance_data, security_rules_data, volume_data, instance_tags_data
+    :rtype: list, list, list, list
+    """
+
+    groups = get_account_groups(list_df)
+    logActions("INF", f"Collecting {len(groups)} account and Region combinations", None)
+
+    # A single executor caps the requests in flight of all accounts together
+    request_executor = ThreadPoolExecutor(max_workers=concurrency) if async_mode else None
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(account_concurrency, len(groups)))) as executor:
+            results = list(
+                executor.map(
+                    lambda group: get_account_ec2_details(
+                        *group, role_name, concurrency, request_executor, prefetch, normalize_sg_rules, journal
+                    ),
+                    groups,
+                )
+            )
+    finally:
+        if request_executor is not None:
+            request_executor.shutdown()
+
+    return order_by_list(
+        list_df, *([item for result in results for item in result[i]] for i in range(4))
+    )
+
+
+def order_by_list(list_df, *details):
+    """Puts detail rows in the order of the List sheet, keeping the order of each instance's rows
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :param details: Detail lists with an InstanceID key
+    :type details: list
+    :return: The sorted detail lists
+    :rtype: tuple
+    """
+
+    positions = {
+        instance_id: position
+        for position, instance_id in enumerate(dict.fromkeys(list_df["OriginInstanceID"]))
+    }
+    return tuple(
+        sorted(items, key=lambda item: positions.get(item["InstanceID"], len(positions)))
+        for items in details
+    )
+
+
+def add_journaled_results(list_df, journal, details):
+    """Adds the instances parsed by the interrupted execution to the detail lists
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :param journal: Checkpoint journal of the execution
+    :type journal: Journal
+    :param details: instance_data, security_rules_data, volume_data, instance_tags_data of the instances parsed now
+    :type details: tuple
+    :return: instance_data, security_rules_data, volume_data, instance_tags_data
+    :rtype: list, list, list, list
+    """
+
+    instance_ids = set(list_df["OriginInstanceID"])
+    entries = [entry for key, entry in journal.entries.items() if key in instance_ids]
+    for entry in entries:
+        security_group_index.update(entry.get("SecurityGroups", {}))
+    journaled = merge_instance_results([entry["Result"] for entry in entries])
+    return order_by_list(
+        list_df, *(journaled[i] + details[i] for i in range(4))
+    )
+
+
+def add_regions(list_df, *details):
+    """Tags the detail rows with the Region of their source server, for XLS docs listing several Regions
+
+    :param list_df: Instance List
+    :type list_df: pd dataframe
+    :param details: Detail lists with an InstanceID key
+    :type details: list
+    """
+
+    if "Region" not in list_df.columns:
+        return
+    regions = dict(zip(list_df["OriginInstanceID"], list_df["Region"]))
+    for items in details:
+        for item in items:
+            item["Region"] = regions.get(item["InstanceID"])
+
+
+def get_region_sg_rules(sg_mappings):
+    """Returns the rules of every mapped security group, flattened once per group and Region
+
+    :param sg_mappings: Instance to security group mapping, tagged with Regions by add_regions if the List has them
+    :type sg_mappings: list
+    :return: Security group rules
+    :rtype: list
+    """
+
+    if not any("Region" in mapping for mapping in sg_mappings):
+        return get_normalized_sg_rules(sg_mappings, security_group_index)
+
+    sg_rules = []
+    for region in dict.fromkeys(mapping["Region"] for mapping in sg_mappings):
+        region_mappings = [mapping for mapping in sg_mappings if mapping["Region"] == region]
+        sg_rules.extend(
+            {**sg_rule, "Region": region}
+            for sg_rule in get_normalized_sg_rules(region_mappings, security_group_index)
+        )
+    return sg_rules
+
+
 def update_workbook(
-    instance_data, security_rules_data, volume_data, instance_tags_data, file_path
+    instance_data, security_rules_data, volume_data, instance_tags_data, file_path, sg_rules_data=None
 ):
     """Updates the XLS doc with EC2 related info
 
     :param instance_data: Instance data
     :type instance_data: list
-    :param security_rules_data: Security Group data
+    :param security_rules_data: Security Group data (instance to group mapping if sg_rules_data is set)
     :type security_rules_data: list
     :param volume_data: Volume data
     :type volume_data: list
@@ -377,6 +895,10 @@ def update_workbook(
     :type instance_tags_data: list
     :param file_path: Path to the XLS doc
     :type file_path: string
+    :param sg_rules_data: Normalized Security Group rules, None for the per-instance rules view
+    :type sg_rules_data: list
+    :return: True if the XLS doc was updated
+    :rtype: bool
     """
     
     try:
@@ -386,44 +908,155 @@ def update_workbook(
         volume_df = pd.DataFrame(volume_data)
         instance_tags_df = pd.DataFrame(instance_tags_data)
 
-        # Save all DataFrames to Excel
-        with pd.ExcelWriter(
-            file_path, engine="openpyxl", mode="a", if_sheet_exists="replace"
-        ) as writer:
-            instance_df.to_excel(writer, sheet_name="EC2_Details", index=False)
-            security_rules_df.to_excel(writer, sheet_name="EC2_SG_Details", index=False)
-            volume_df.to_excel(writer, sheet_name="EC2_Vol_Details", index=False)
-            instance_tags_df.to_excel(writer, sheet_name="EC2_Tag_Details", index=False)
+        sheets = {"EC2_Details": instance_df}
+        remove_sheets = []
+        if sg_rules_data is None:
+            sheets["EC2_SG_Details"] = security_rules_df
+        else:
+            sheets["EC2_Instance_SGs"] = security_rules_df
+            sheets["EC2_SG_Rules"] = pd.DataFrame(sg_rules_data)
+            # Drop the per-instance view of a previous run, it would be stale
+            remove_sheets.append("EC2_SG_Details")
+        sheets["EC2_Vol_Details"] = volume_df
+        sheets["EC2_Tag_Details"] = instance_tags_df
 
-        logActions("INF", f"Successfully updated XLS document ({file_path})", None)
+        # Only the sheets whose content changed are rewritten
+        modified = write_sheets(file_path, sheets, remove_sheets)
+
+        if modified:
+            logActions("INF", f"Successfully updated XLS document ({file_path}), modified sheets: {', '.join(modified)}", None)
+        else:
+            logActions("INF", f"XLS document is up to date, nothing to write ({file_path})", None)
+        return True
     except Exception as e:
         logActions("ERR", f"Failed to update XLS document ({file_path})", e)
+        return False
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
 
     parser.add_argument(
-        "--region", type=str, required=True, help="Name of the Prod Region"
+        "--region", type=str, required=False, help="Name of the Prod Region. Required unless '--role-name' is set"
+    )
+    parser.add_argument(
+        "--workbook-path", type=str, required=False, help="Path to the XLSX file, or to a SQLite state file (.db)"
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Load all VPCs, subnets and security groups of the region upfront instead of describing them per instance",
+    )
+    parser.add_argument(
+        "--async",
+        dest="async_mode",
+        action="store_true",
+        help="Parse the instances concurrently with asyncio",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Maximum number of requests in flight when '--async' is set, across all accounts when '--role-name' is set",
+    )
+    parser.add_argument(
+        "--normalize-sg-rules",
+        action="store_true",
+        help="Write each security group's rules once (EC2_SG_Rules) along with an instance to security group mapping (EC2_Instance_SGs), instead of the per-instance EC2_SG_Details sheet",
     )
     parser.add_argument(
-        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+        "--role-name",
+        type=str,
+        required=False,
+        help="IAM role to assume in every origin account of the List sheet (OriginAccountID, OriginRegion columns)",
+    )
+    parser.add_argument(
+        "--account-concurrency",
+        type=int,
+        default=8,
+        help="Number of origin accounts and Regions collected concurrently when '--role-name' is set",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted execution, skipping the instances already in its checkpoint journal",
     )
     # Parse the arguments
     args = parser.parse_args()
     region = args.region
     file_path = args.workbook_path
+    prefetch = args.prefetch
+    async_mode = args.async_mode
+    concurrency = args.concurrency if async_mode else 1
+    normalize_sg_rules = args.normalize_sg_rules
+    role_name = args.role_name
+    account_concurrency = args.account_concurrency
 
     # Not providing '--workbook-path' option defaults in './DRS_Templates.xlsx'
     if file_path == None:
         file_path = "DRS_Templates.xlsx"
 
-    ec2_client = init_aws_clients(region)
+    if concurrency < 1 or account_concurrency < 1:
+        logActions("ERR", "Invalid concurrency. It must be at least 1", None)
+        exit(1)
+
+    if region == None and role_name == None:
+        logActions("ERR", "The '--region' option is required unless '--role-name' is set", None)
+        exit(1)
+
+    # Ctrl-C lets the instances in progress finish and keeps the checkpoint journal
+    handle_interrupts()
     list_df = read_excel(file_path)
+    journal_path = get_journal_path(file_path, "ec2")
+    try:
+        journal = Journal(journal_path, {"NormalizeSgRules": normalize_sg_rules}, args.resume)
+    except Exception as e:
+        logActions("ERR", f"Failed to open checkpoint journal ({journal_path})", e)
+        exit(1)
+    pending_df = list_df[~list_df["OriginInstanceID"].isin(list(journal.entries))]
+    if journal.entries:
+        logActions(
+            "INF",
+            f"Resuming from the checkpoint journal: {len(list_df) - len(pending_df)} instances already parsed, {len(pending_df)} left",
+            None,
+        )
+
+    if role_name != None:
+        if not {"OriginAccountID", "OriginRegion"}.issubset(list_df.columns):
+            logActions("ERR", "The List sheet has no OriginAccountID/OriginRegion columns. Run parse_drs_info.py first", None)
+            exit(1)
+        details = get_all_accounts_ec2_details(
+            pending_df, role_name, account_concurrency, concurrency, async_mode, prefetch, normalize_sg_rules, journal
+        )
+    else:
+        ec2_client = init_aws_clients(region, concurrency)
+        if prefetch:
+            prefetch_reference_data(ec2_client)
+        if async_mode:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                details = asyncio.run(
+                    get_ec2_details_async(
+                        pending_df, ec2_client, executor, normalize_sg_rules, journal
+                    )
+                )
+        else:
+            details = get_ec2_details(pending_df, ec2_client, normalize_sg_rules, journal)
+    journal.close()
+
+    if stop_requested.is_set():
+        logActions("INF", "Execution interrupted, the parsed instances are kept in the checkpoint journal. Execute again with '--resume' to continue", None)
+        exit(130)
     instance_data, security_rules_data, volume_data, instance_tags_data = (
-        get_ec2_details(list_df, ec2_client)
-    )
-    update_workbook(
-        instance_data, security_rules_data, volume_data, instance_tags_data, file_path
+        add_journaled_results(list_df, journal, details)
     )
+    # XLS docs listing several Regions tag every row with the Region of its source server
+    add_regions(list_df, instance_data, security_rules_data, volume_data, instance_tags_data)
+    sg_rules_data = None
+    if normalize_sg_rules:
+        sg_rules_data = get_region_sg_rules(security_rules_data)
+    if update_workbook(
+        instance_data, security_rules_data, volume_data, instance_tags_data, file_path, sg_rules_data
+    ):
+        remove_journal(journal_path)
+    logActions("INF", rate_controller.get_summary(), None)
     logActions("INF", f"Execution finished", None)
@@ -0,0 +1,797 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import posixpath
+import sqlite3
+import tempfile
+import zipfile
+import pandas as pd
+from xml.etree import ElementTree
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Alignment, Border, Font, Side
+from log_utils import logActions
+
+# Paths with these extensions are SQLite state files instead of XLS docs
+STATE_DB_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+# Columns indexed in every state file table that has them
+STATE_DB_KEY_COLUMNS = ("SourceServerID", "OriginInstanceID", "InstanceID")
+# Maximum number of keys bound to a single state file query
+STATE_DB_KEY_BATCH_SIZE = 500
+# Table holding the content hash of every sheet stored in a state file
+STATE_DB_HASH_TABLE = "_sheet_hashes"
+# Placeholder column of sheets without columns, SQLite tables need at least one
+STATE_DB_EMPTY_COLUMN = "_empty"
+# Prefix of the zip comment holding the content hash of every sheet written to an XLS doc
+XLSX_HASH_COMMENT = b"sheet-hashes:"
+# Namespaces of the workbook part and of its relationships
+SPREADSHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+RELATIONSHIP_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PACKAGE_RELATIONSHIP_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+# SQLite stores booleans as integers, the declared column type restores them
+sqlite3.register_converter("BOOLEAN", lambda value: value == b"1")
+
+
+def is_state_db(file_path):
+    """Checks if a path points to a SQLite state file rather than an XLS doc
+
+    :param file_path: Path to the XLS doc or state file
+    :type file_path: string
+    :return: True for state files
+    :rtype: bool
+    """
+
+    return os.path.splitext(file_path)[1].lower() in STATE_DB_EXTENSIONS
+
+
+def quote_identifier(name):
+    """Quotes a sheet or column name for use in SQLite statements
+
+    :param name: Sheet or column name
+    :type name: string
+    :return: Quoted name
+    :rtype: string
+    """
+
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def get_state_tables(connection):
+    """Returns the sheets stored in a state file, in creation order
+
+    :param connection: State file connection
+    :type connection: sqlite3 connection
+    :return: Sheet names
+    :rtype: list
+    """
+
+    rows = connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name != ? ORDER BY rowid",
+        (STATE_DB_HASH_TABLE,),
+    )
+    return [row[0] for row in rows]
+
+
+def get_sheet_names(file_path):
+    """Returns the sheets of an XLS doc or state file
+
+    :param file_path: Path to the XLS doc or state file
+    :type file_path: string
+    :return: Sheet names
+    :rtype: list
+    """
+
+    if is_state_db(file_path):
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"State file {file_path} does not exist")
+        with sqlite3.connect(file_path) as connection:
+            return get_state_tables(connection)
+
+    with pd.ExcelFile(file_path, engine="openpyxl") as workbook:
+        return workbook.sheet_names
+
+
+def load_sheets(file_path, sheets, optional_sheets=(), keys=None, preserve_types=False):
+    """Opens the XLS doc (or state file) once and returns the requested sheets
+
+    :param file_path: Path to the XLS doc or state file
+    :type file_path: string
+    :param sheets: Sheet names mapped to the columns to read (None reads all columns)
+    :type sheets: dict
+    :param optional_sheets: Sheets that may be missing from the XLS doc, returned as empty dataframes
+    :type optional_sheets: list
+    :param keys: Sheet names mapped to a key column and its values, only the rows of these keys are returned
+    :type keys: dict
+    :param preserve_types: Keep the values as stored, e.g. account IDs stored as text are not read as numbers
+    :type preserve_types: bool
+    :return: Sheet names mapped to their data
+    :rtype: dict
+    """
+
+    keys = keys or {}
+    # State files keep the stored types, only XLS values are inferred by pandas
+    if is_state_db(file_path):
+        return load_state_tables(file_path, sheets, optional_sheets, keys)
+
+    frames = {}
+    with pd.ExcelFile(file_path, engine="openpyxl") as workbook:
+        for sheet_name, columns in sheets.items():
+            if sheet_name not in workbook.sheet_names:
+                if sheet_name not in optional_sheets:
+                    raise ValueError(f"Worksheet {sheet_name} does not exist")
+                frames[sheet_name] = pd.DataFrame()
+                continue
+
+            # Columns missing from the sheet are skipped rather than failing the read
+            usecols = None if columns is None else (lambda column: column in columns)
+            frames[sheet_name] = workbook.parse(
+                sheet_name, usecols=usecols, dtype=object if preserve_types else None
+            )
+            if sheet_name in keys:
+                key, key_values = keys[sheet_name]
+                df = frames[sheet_name]
+                frames[sheet_name] = df[df[key].isin(list(key_values))].reset_index(drop=True)
+
+    return frames
+
+
+def load_state_tables(file_path, sheets, optional_sheets=(), keys=None):
+    """Returns the requested sheets from a state file
+
+    Sheets with keys are read with indexed lookups of the key values.
+
+    :param file_path: Path to the state file
+    :type file_path: string
+    :param sheets: Sheet names mapped to the columns to read (None reads all columns)
+    :type sheets: dict
+    :param optional_sheets: Sheets that may be missing from the state file, returned as empty dataframes
+    :type optional_sheets: list
+    :param keys: Sheet names mapped to a key column and its values, only the rows of these keys are returned
+    :type keys: dict
+    :return: Sheet names mapped to their data
+    :rtype: dict
+    """
+
+    keys = keys or {}
+
+    # Connecting would silently create an empty state file
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"State file {file_path} does not exist")
+
+    frames = {}
+    with sqlite3.connect(file_path, detect_types=sqlite3.PARSE_DECLTYPES) as connection:
+        tables = get_state_tables(connection)
+        for sheet_name, columns in sheets.items():
+            if sheet_name not in tables:
+                if sheet_name not in optional_sheets:
+                    raise ValueError(f"Worksheet {sheet_name} does not exist")
+                frames[sheet_name] = pd.DataFrame()
+                continue
+
+            table_columns = [
+                row[1]
+                for row in connection.execute(
+                    f"PRAGMA table_info({quote_identifier(sheet_name)})"
+                )
+            ]
+            if table_columns == [STATE_DB_EMPTY_COLUMN]:
+                frames[sheet_name] = pd.DataFrame()
+                continue
+            key, key_values = keys.get(sheet_name, (None, None))
+            if key is not None and key not in table_columns:
+                raise ValueError(f"Worksheet {sheet_name} has no {key} column")
+            if columns is not None:
+                table_columns = [column for column in table_columns if column in columns]
+            selected = ", ".join(quote_identifier(column) for column in table_columns)
+            table = quote_identifier(sheet_name)
+            if key is None:
+                frames[sheet_name] = pd.read_sql_query(f"SELECT {selected} FROM {table}", connection)
+                continue
+
+            # Batches keep the number of bound values under the SQLite limit, rowid keeps the row order
+            key_values = [state_value(value) for value in dict.fromkeys(key_values)]
+            batches = [
+                pd.read_sql_query(
+                    "SELECT {}, rowid AS _rowid FROM {} WHERE {} IN ({})".format(
+                        selected, table, quote_identifier(key), ", ".join("?" for _ in batch)
+                    ),
+                    connection,
+                    params=batch,
+                )
+                for batch in (
+                    key_values[start : start + STATE_DB_KEY_BATCH_SIZE]
+                    for start in range(0, len(key_values), STATE_DB_KEY_BATCH_SIZE)
+                )
+            ]
+            if not batches:
+                frames[sheet_name] = pd.DataFrame(columns=table_columns)
+                continue
+            frames[sheet_name] = (
+                pd.concat(batches, ignore_index=True)
+                .sort_values("_rowid", kind="stable")
+                .drop(columns="_rowid")
+                .reset_index(drop=True)
+            )
+
+    return frames
+
+
+def patch_rows(df, new_df, key, key_values):
+    """Replaces the rows of the given keys in a sheet, keeping the order of the other rows
+
+    The new rows of a key take the position of the first old row of that key.
+    Keys that had no rows are appended at the end.
+
+    :param df: Sheet data
+    :type df: pd dataframe
+    :param new_df: New rows of the given keys
+    :type new_df: pd dataframe
+    :param key: Key column
+    :type key: string
+    :param key_values: Keys whose rows are replaced, even if they have no new rows
+    :type key_values: list
+    :return: Patched sheet data
+    :rtype: pd dataframe
+    """
+
+    if df.empty:
+        return new_df.reset_index(drop=True)
+    if new_df.empty:
+        return df[~df[key].isin(key_values)].reset_index(drop=True)
+
+    first_positions = {}
+    for position, value in enumerate(df[key]):
+        first_positions.setdefault(value, position)
+
+    kept = df[~df[key].isin(key_values)]
+    positions = pd.concat(
+        [
+            pd.Series(range(len(df)))[~df[key].isin(key_values).values],
+            new_df[key].map(lambda value: first_positions.get(value, len(df))),
+        ],
+        ignore_index=True,
+    )
+    # A stable sort keeps the new rows of each key in their own order
+    patched = pd.concat([kept, new_df], ignore_index=True)
+    return patched.iloc[positions.argsort(kind="stable")].reset_index(drop=True)
+
+
+def normalize_value(value):
+    """Converts a dataframe or cell value to the python value stored in the XLS doc
+
+    :param value: Dataframe or cell value
+    :type value: any
+    :return: Normalized value, None for empty cells
+    :rtype: any
+    """
+
+    if value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        # Read back from the XLS doc as a datetime
+        return value.to_pydatetime()
+    if hasattr(value, "item"):
+        value = value.item()
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def normalize_rows(rows):
+    """Yields rows without trailing empty cells, skipping trailing empty rows
+
+    :param rows: Row values
+    :type rows: iterable
+    :return: generator of normalized row tuples
+    :rtype: generator
+    """
+
+    empty_rows = 0
+    for row in rows:
+        row = [normalize_value(value) for value in row]
+        while row and row[-1] is None:
+            row.pop()
+        if not row:
+            empty_rows += 1
+            continue
+        # Empty rows are only kept when followed by a non-empty one
+        for _ in range(empty_rows):
+            yield ()
+        empty_rows = 0
+        yield tuple(row)
+
+
+def content_hash(rows):
+    """Returns a hash of the values of a sheet
+
+    :param rows: Row values, header included
+    :type rows: iterable
+    :return: SHA-256 hex digest
+    :rtype: string
+    """
+
+    digest = hashlib.sha256()
+    for row in normalize_rows(rows):
+        digest.update(repr(row).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def frame_rows(df):
+    """Yields the header and the data rows of a dataframe
+
+    :param df: Sheet data
+    :type df: pd dataframe
+    :return: generator of row values
+    :rtype: generator
+    """
+
+    yield list(df.columns)
+    yield from df.itertuples(index=False, name=None)
+
+
+def replace_file(temp_path, file_path):
+    """Moves a temporary file over a file, keeping the permissions of the file it replaces
+
+    Temporary files are created readable by their owner only. The replaced
+    file keeps its mode, a new file gets the default mode of the umask.
+
+    :param temp_path: Path to the temporary file
+    :type temp_path: string
+    :param file_path: Path to the file to replace
+    :type file_path: string
+    """
+
+    try:
+        mode = os.stat(file_path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(temp_path, mode)
+    os.replace(temp_path, file_path)
+
+
+def save_workbook(workbook, file_path, hashes=None):
+    """Saves an openpyxl workbook atomically, through a temporary file in the same directory
+
+    A failure while saving leaves the existing XLS doc untouched.
+
+    :param workbook: Workbook to save
+    :type workbook: openpyxl workbook
+    :param file_path: Path to the XLS doc
+    :type file_path: string
+    :param hashes: Sheet names mapped to their content hash, stored in the XLS doc
+    :type hashes: dict
+    """
+
+    fd, temp_path = tempfile.mkstemp(
+        suffix=".xlsx", dir=os.path.dirname(os.path.abspath(file_path))
+    )
+    os.close(fd)
+    try:
+        workbook.save(temp_path)
+        if hashes:
+            store_hashes(temp_path, hashes)
+        replace_file(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def set_header_style(cell):
+    """Styles a header cell like the headers written by pandas
+
+    :param cell: Header cell
+    :type cell: openpyxl cell
+    """
+
+    thin = Side(style="thin")
+    cell.font = Font(bold=True)
+    cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    cell.alignment = Alignment(horizontal="center", vertical="top")
+
+
+def cell_value(value):
+    """Converts a dataframe value to a value openpyxl can write
+
+    :param value: Dataframe value
+    :type value: any
+    :return: Cell value, without the control characters XML cannot hold
+    :rtype: any
+    """
+
+    value = normalize_value(value)
+    if isinstance(value, str):
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)
+    return value
+
+
+def get_sheet_parts(package):
+    """Returns the zip part of every sheet of an XLS doc
+
+    :param package: XLS doc
+    :type package: zipfile
+    :return: Sheet names mapped to their part names
+    :rtype: dict
+    """
+
+    workbook = ElementTree.fromstring(package.read("xl/workbook.xml"))
+    relationships = ElementTree.fromstring(package.read("xl/_rels/workbook.xml.rels"))
+    targets = {
+        relationship.get("Id"): relationship.get("Target")
+        for relationship in relationships.iter(f"{{{PACKAGE_RELATIONSHIP_NS}}}Relationship")
+    }
+
+    parts = {}
+    for sheet in workbook.iter(f"{{{SPREADSHEET_NS}}}sheet"):
+        target = targets.get(sheet.get(f"{{{RELATIONSHIP_NS}}}id"))
+        if target is None:
+            continue
+        # Targets are relative to the workbook part, or absolute from the package root
+        if target.startswith("/"):
+            parts[sheet.get("name")] = target[1:]
+        else:
+            parts[sheet.get("name")] = posixpath.normpath(posixpath.join("xl", target))
+    return parts
+
+
+def get_stored_hashes(file_path):
+    """Returns the content hashes stored in an XLS doc by write_workbook_sheets
+
+    A hash is only returned while its sheet part has the checksum it was
+    stored with. Saving the XLS doc with Excel drops the zip comment, and
+    sheets edited by other tools no longer match their checksum.
+
+    :param file_path: Path to the XLS doc
+    :type file_path: string
+    :return: Sheet names mapped to their content hash
+    :rtype: dict
+    """
+
+    try:
+        with zipfile.ZipFile(file_path) as package:
+            if not package.comment.startswith(XLSX_HASH_COMMENT):
+                return {}
+            stored = json.loads(package.comment[len(XLSX_HASH_COMMENT):])
+            parts = get_sheet_parts(package)
+            checksums = {info.filename: info.CRC for info in package.infolist()}
+    except (KeyError, ValueError, ElementTree.ParseError, zipfile.BadZipFile):
+        return {}
+
+    return {
+        sheet_name: sheet_hash
+        for sheet_name, (sheet_hash, checksum) in stored.items()
+        if sheet_name in parts and checksums.get(parts[sheet_name]) == checksum
+    }
+
+
+def store_hashes(file_path, hashes):
+    """Stores the content hash of every sheet in the zip comment of an XLS doc
+
+    Only the end of the zip is rewritten, the parts are not recompressed.
+
+    :param file_path: Path to the XLS doc
+    :type file_path: string
+    :param hashes: Sheet names mapped to their content hash
+    :type hashes: dict
+    """
+
+    with zipfile.ZipFile(file_path, "a") as package:
+        parts = get_sheet_parts(package)
+        checksums = {info.filename: info.CRC for info in package.infolist()}
+        package.comment = XLSX_HASH_COMMENT + json.dumps(
+            {
+                sheet_name: [sheet_hash, checksums[parts[sheet_name]]]
+                for sheet_name, sheet_hash in hashes.items()
+                if sheet_name in parts
+            }
+        ).encode()
+
+
+def write_worksheet(worksheet, df):
+    """Writes a dataframe to an empty sheet, with a header styled like the headers written by pandas
+
+    :param worksheet: Empty sheet
+    :type worksheet: openpyxl worksheet
+    :param df: Sheet data
+    :type df: pd dataframe
+    """
+
+    if len(df.columns):
+        worksheet.append([cell_value(column) for column in df.columns])
+        for cell in worksheet[1]:
+            set_header_style(cell)
+    for row in df.itertuples(index=False, name=None):
+        worksheet.append([cell_value(value) for value in row])
+
+
+def write_workbook_sheets(file_path, sheets, remove_sheets=()):
+    """Writes dataframes to an XLS doc, replacing only the sheets whose content changed
+
+    The content hash of every sheet is stored in the zip comment of the XLS
+    doc, with the checksum of its part. When every sheet matches its stored
+    hash, the XLS doc is neither read nor saved. Sheets without a valid
+    stored hash (e.g. the XLS doc was saved by Excel) are read and hashed.
+    openpyxl only saves a workbook as a whole, so once a sheet changed the
+    XLS doc is loaded and saved completely.
+
+    :param file_path: Path to the XLS doc, created if it does not exist
+    :type file_path: string
+    :param sheets: Sheet names mapped to their data
+    :type sheets: dict
+    :param remove_sheets: Sheets to remove from the XLS doc if they exist
+    :type remove_sheets: list
+    :return: Names of the sheets that were written or removed
+    :rtype: list
+    """
+
+    new_hashes = {sheet_name: content_hash(frame_rows(df)) for sheet_name, df in sheets.items()}
+    stored_hashes = {}
+    if os.path.exists(file_path):
+        stored_hashes = get_stored_hashes(file_path)
+        unchanged = all(stored_hashes.get(sheet_name) == sheet_hash for sheet_name, sheet_hash in new_hashes.items())
+        if unchanged and not set(remove_sheets) & set(get_sheet_names(file_path)):
+            return []
+        workbook = load_workbook(file_path)
+    else:
+        workbook = Workbook()
+        workbook.remove(workbook.active)
+
+    modified = []
+    for sheet_name, df in sheets.items():
+        if sheet_name in workbook.sheetnames:
+            worksheet = workbook[sheet_name]
+            current_hash = stored_hashes.get(sheet_name)
+            if current_hash is None:
+                current_hash = content_hash(worksheet.iter_rows(values_only=True))
+            if current_hash == new_hashes[sheet_name]:
+                continue
+            # Replace the sheet in place to keep the order of the sheets
+            position = workbook.sheetnames.index(sheet_name)
+            workbook.remove(worksheet)
+            worksheet = workbook.create_sheet(sheet_name, position)
+        else:
+            worksheet = workbook.create_sheet(sheet_name)
+
+        write_worksheet(worksheet, df)
+        modified.append(sheet_name)
+
+    for sheet_name in remove_sheets:
+        if sheet_name in workbook.sheetnames:
+            workbook.remove(workbook[sheet_name])
+            modified.append(sheet_name)
+
+    if modified:
+        save_workbook(workbook, file_path, {**stored_hashes, **new_hashes})
+    return modified
+
+
+def write_sheets(file_path, sheets, remove_sheets=()):
+    """Writes dataframes to the XLS doc (or state file), replacing only the sheets whose content changed
+
+    Every sheet is compared with the current content of the XLS doc by hash.
+    Unchanged sheets are left as they are, and the XLS doc is not saved at all
+    if nothing changed. Saving is atomic.
+
+    :param file_path: Path to the XLS doc or state file, created if it does not exist
+    :type file_path: string
+    :param sheets: Sheet names mapped to their data
+    :type sheets: dict
+    :param remove_sheets: Sheets to remove from the XLS doc if they exist
+    :type remove_sheets: list
+    :return: Names of the sheets that were written or removed
+    :rtype: list
+    """
+
+    if is_state_db(file_path):
+        return write_state_tables(file_path, sheets, remove_sheets)
+    return write_workbook_sheets(file_path, sheets, remove_sheets)
+
+
+def state_value(value):
+    """Converts a dataframe value to a value SQLite can store
+
+    :param value: Dataframe value
+    :type value: any
+    :return: Normalized value, dates and other objects as strings
+    :rtype: any
+    """
+
+    value = normalize_value(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def column_type(column):
+    """Returns the declared SQLite type of a dataframe column
+
+    Only boolean columns get a type, every other value is stored as is.
+
+    :param column: Dataframe column
+    :type column: pd series
+    :return: Type declaration, empty for untyped columns
+    :rtype: string
+    """
+
+    values = column.dropna()
+    if len(values) and all(isinstance(normalize_value(value), bool) for value in values):
+        return " BOOLEAN"
+    return ""
+
+
+def write_state_tables(file_path, sheets, remove_sheets=()):
+    """Writes dataframes to a state file, replacing only the tables whose content changed
+
+    The content hash of every table is kept in the state file, so unchanged
+    sheets are detected without reading them back. All changes are committed
+    in a single transaction.
+
+    :param file_path: Path to the state file, created if it does not exist
+    :type file_path: string
+    :param sheets: Sheet names mapped to their data
+    :type sheets: dict
+    :param remove_sheets: Sheets to remove from the state file if they exist
+    :type remove_sheets: list
+    :return: Names of the sheets that were written or removed
+    :rtype: list
+    """
+
+    modified = []
+    connection = sqlite3.connect(file_path)
+    try:
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {STATE_DB_HASH_TABLE} (name TEXT PRIMARY KEY, hash TEXT)"
+        )
+        tables = get_state_tables(connection)
+        hashes = dict(connection.execute(f"SELECT name, hash FROM {STATE_DB_HASH_TABLE}"))
+
+        for sheet_name, df in sheets.items():
+            sheet_hash = content_hash(frame_rows(df))
+            if sheet_name in tables and hashes.get(sheet_name) == sheet_hash:
+                continue
+
+            table = quote_identifier(sheet_name)
+            connection.execute(f"DROP TABLE IF EXISTS {table}")
+            if len(df.columns):
+                connection.execute(
+                    "CREATE TABLE {} ({})".format(
+                        table,
+                        ", ".join(
+                            quote_identifier(column) + column_type(df[column])
+                            for column in df.columns
+                        ),
+                    )
+                )
+                connection.executemany(
+                    "INSERT INTO {} VALUES ({})".format(
+                        table, ", ".join("?" for _ in df.columns)
+                    ),
+                    (
+                        [state_value(value) for value in row]
+                        for row in df.itertuples(index=False, name=None)
+                    ),
+                )
+            else:
+                connection.execute(f"CREATE TABLE {table} ({STATE_DB_EMPTY_COLUMN})")
+
+            # Stage to stage lookups go through the server and instance IDs
+            for column in STATE_DB_KEY_COLUMNS:
+                if column in df.columns:
+                    connection.execute(
+                        "CREATE INDEX {} ON {} ({})".format(
+                            quote_identifier(f"idx_{sheet_name}_{column}"),
+                            table,
+                            quote_identifier(column),
+                        )
+                    )
+            connection.execute(
+                f"INSERT OR REPLACE INTO {STATE_DB_HASH_TABLE} (name, hash) VALUES (?, ?)",
+                (sheet_name, sheet_hash),
+            )
+            modified.append(sheet_name)
+
+        for sheet_name in remove_sheets:
+            if sheet_name in tables:
+                connection.execute(f"DROP TABLE {quote_identifier(sheet_name)}")
+                connection.execute(
+                    f"DELETE FROM {STATE_DB_HASH_TABLE} WHERE name = ?", (sheet_name,)
+                )
+                modified.append(sheet_name)
+
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    return modified
+
+
+def create_state_db(file_path, sheets):
+    """Creates a state file holding only the given sheets, replacing any existing one atomically
+
+    :param file_path: Path to the state file
+    :type file_path: string
+    :param sheets: Sheet names mapped to their data
+    :type sheets: dict
+    """
+
+    fd, temp_path = tempfile.mkstemp(
+        suffix=".db", dir=os.path.dirname(os.path.abspath(file_path))
+    )
+    os.close(fd)
+    try:
+        write_state_tables(temp_path, sheets)
+        replace_file(temp_path, file_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def copy_sheets(source_path, target_path):
+    """Copies every sheet between an XLS doc and a state file
+
+    :param source_path: Path to the XLS doc or state file to read
+    :type source_path: string
+    :param target_path: Path to the XLS doc or state file to update
+    :type target_path: string
+    """
+
+    try:
+        sheet_names = get_sheet_names(source_path)
+        frames = load_sheets(source_path, {sheet_name: None for sheet_name in sheet_names})
+        modified = write_sheets(target_path, frames)
+        logActions(
+            "INF",
+            f"Successfully copied {len(sheet_names)} sheets from {source_path} to {target_path}, modified sheets: {', '.join(modified) or 'none'}",
+            None,
+        )
+    except Exception as e:
+        logActions("ERR", f"Failed to copy sheets from {source_path} to {target_path}", e)
+        exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "action",
+        choices=["export", "import"],
+        help="'export' writes the state file to the XLS doc, 'import' loads the XLS doc into the state file",
+    )
+    parser.add_argument(
+        "--state-path", type=str, required=True, help="Path to the SQLite state file (.db)"
+    )
+    parser.add_argument(
+        "--workbook-path", type=str, required=False, help="Path to the XLSX file"
+    )
+    # Parse the arguments
+    args = parser.parse_args()
+    state_path = args.state_path
+    file_path = args.workbook_path
+
+    # Not providing '--workbook-path' option defaults in './DRS_Templates.xlsx'
+    if file_path == None:
+        file_path = "DRS_Templates.xlsx"
+
+    if not is_state_db(state_path):
+        logActions(
+            "ERR",
+            f"State file path must end in one of: {', '.join(STATE_DB_EXTENSIONS)}",
+            None,
+        )
+        exit(1)
+
+    if args.action == "export":
+        copy_sheets(state_path, file_path)
+    else:
+        copy_sheets(file_path, state_path)
+    logActions("INF", f"Execution finished", None)